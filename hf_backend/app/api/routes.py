@@ -1,14 +1,16 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.responses import FileResponse, JSONResponse
+from starlette.requests import ClientDisconnect
 import os
+import base64
 import uuid
 import json
 import asyncio
-import aiofiles
 from app.core.config import settings
+from app.api.uploads import StreamedUpload, InvalidUpload, UploadTooLarge
 from custom_logger import logger_config as logger
 from app.db import crud
-from app.services.worker import start_worker, is_worker_running
+from app.services.worker import start_worker, notify_worker, is_worker_running
 from app.services.streaming import StreamingSTT, ALLOWED_MODELS
 
 router = APIRouter()
@@ -18,60 +20,97 @@ router = APIRouter()
 ACTIVE_WS_CONNECTIONS = 0
 MAX_WS_CONNECTIONS = 4
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in settings.ALLOWED_EXTENSIONS
-
 @router.get("/")
 async def index():
     return FileResponse('index.html')
 
 @router.post("/api/tasks/upload")
-async def upload_task(audio: UploadFile = File(...), hide_from_ui: str = Form("")):
-    if not audio.filename:
-        raise HTTPException(status_code=400, detail="No file selected")
-    
-    if not allowed_file(audio.filename):
-        raise HTTPException(status_code=400, detail="Invalid file type")
-    
+async def upload_task(request: Request):
+    """Store an uploaded file (multipart field `audio`) and queue it.
+
+    The body is parsed as it arrives, see StreamedUpload.
+    """
     task_id = str(uuid.uuid4())
-    filename = audio.filename
-    filepath = os.path.join(settings.UPLOAD_FOLDER, f"{task_id}_{filename}")
-    
+    upload = StreamedUpload(task_id)
     try:
-        async with aiofiles.open(filepath, 'wb') as out_file:
-            content = await audio.read()
-            await out_file.write(content)
-        logger.info(f"File uploaded successfully: {filename} -> {filepath}")
+        await upload.receive(request)
+        logger.info(f"File uploaded successfully: {upload.filename} -> {upload.filepath} ({upload.size} bytes, sha256 {upload.sha256})")
+    except InvalidUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UploadTooLarge:
+        logger.warning(f"Rejected upload {upload.filename}: larger than {settings.MAX_UPLOAD_BYTES} bytes")
+        raise HTTPException(status_code=413, detail=f"File too large, the limit is {settings.MAX_UPLOAD_BYTES} bytes")
+    except ClientDisconnect:
+        logger.warning(f"Client disconnected during the upload of {upload.filename}")
+        raise HTTPException(status_code=400, detail="Upload interrupted")
     except Exception as e:
-        logger.error(f"Error saving uploaded file {filename}: {e}")
+        logger.error(f"Error saving uploaded file {upload.filename}: {e}")
         raise HTTPException(status_code=500, detail="Could not save file")
     
-    hide_from_ui_val = 1 if hide_from_ui.lower() in ['true', '1'] else 0
+    filename = upload.filename
+    sha256 = upload.sha256
+    hide_from_ui_val = 1 if upload.fields.get('hide_from_ui', '').lower() in ['true', '1'] else 0
     
-    await crud.insert_task(task_id, filename, filepath, 'not_started', hide_from_ui_val)
+    await crud.insert_task(task_id, filename, upload.filepath, 'not_started', hide_from_ui_val, sha256)
     
     await start_worker()
+    notify_worker()
     
     return JSONResponse(status_code=201, content={
         'id': task_id,
         'filename': filename,
         'status': 'not_started',
+        'sha256': sha256,
         'message': 'File uploaded successfully'
     })
 
+TASK_STATUSES = ('not_started', 'processing', 'completed', 'failed')
+
+def encode_cursor(after):
+    return base64.urlsafe_b64encode(json.dumps(after).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        created_at, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(created_at), str(task_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("/api/tasks")
-async def get_tasks():
-    rows, queue_ids, processing_count, avg_time = await crud.get_all_tasks()
+async def get_tasks(
+    response: Response,
+    limit: int = Query(settings.TASKS_PAGE_SIZE, ge=1, le=settings.TASKS_MAX_PAGE_SIZE),
+    cursor: str = None,
+    status: str = None
+):
+    """Visible tasks, newest first, one page at a time.
+
+    `status` filters by a comma separated list of statuses. When there are more
+    tasks, the X-Next-Cursor header holds the `cursor` for the next page.
+    """
+    statuses = [value.strip() for value in status.split(',') if value.strip()] if status else None
+    if statuses and any(value not in TASK_STATUSES for value in statuses):
+        raise HTTPException(status_code=400, detail=f"Invalid status, expected one of: {', '.join(TASK_STATUSES)}")
+
+    rows, next_after = await crud.list_tasks(limit, decode_cursor(cursor) if cursor else None, statuses)
+    if next_after:
+        response.headers['X-Next-Cursor'] = encode_cursor(next_after)
+
+    queue_positions = {}
+    processing_count = 0
+    avg_time = 0
+    if any(row['status'] == 'not_started' for row in rows):
+        queue_positions = await crud.get_queue_positions()
+        processing_count = await crud.get_processing_count()
+        avg_time = await crud.get_average_processing_time()
     
     tasks = []
     for row in rows:
-        queue_position = None
+        queue_position = queue_positions.get(row['id']) if row['status'] == 'not_started' else None
         estimated_start_seconds = None
         
-        if row['status'] == 'not_started' and row['id'] in queue_ids:
-            queue_position = queue_ids.index(row['id']) + 1
-            tasks_ahead = queue_position - 1 + processing_count
-            estimated_start_seconds = round(tasks_ahead * avg_time)
+        if queue_position is not None:
+            estimated_start_seconds = crud.estimate_start_seconds(queue_position, processing_count, avg_time)
         
         tasks.append({
             'id': row['id'],
@@ -95,12 +134,15 @@ async def get_task(task_id: str):
         raise HTTPException(status_code=404, detail="Task not found")
         
     row, queue_position, estimated_start_seconds = result
+    task_result = row['result']
+    if row['status'] == 'completed':
+        task_result = await crud.get_task_result(task_id)
     
     return {
         'id': row['id'],
         'filename': row['filename'],
         'status': row['status'],
-        'result': row['result'],
+        'result': task_result,
         'created_at': row['created_at'],
         'processed_at': row['processed_at'],
         'progress': row['progress'] or 0,
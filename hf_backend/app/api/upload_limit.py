@@ -0,0 +1,39 @@
+import json
+from custom_logger import logger_config as logger
+
+# Room for the multipart boundaries and form fields around the file itself
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+class UploadSizeLimit:
+    """ASGI middleware that answers 413 to uploads that declare a body over max_bytes.
+
+    Such uploads are refused before any of the body is read. Bodies without a
+    Content-Length are limited by StreamedUpload as they arrive.
+    """
+
+    def __init__(self, app, path: str, max_bytes: int):
+        self.app = app
+        self.path = path
+        self.max_bytes = max_bytes + FORM_OVERHEAD_BYTES
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": f"File too large, the limit is {self.max_bytes - FORM_OVERHEAD_BYTES} bytes"}).encode('utf-8')
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode('ascii')),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == self.path:
+            length = dict(scope["headers"]).get(b"content-length")
+            if length is not None and length.isdigit() and int(length) > self.max_bytes:
+                logger.warning(f"Rejected upload of {int(length)} bytes, over the {self.max_bytes} byte limit")
+                await self._reject(send)
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import aiofiles
+from app.core.config import settings
+
+try:
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:
+    # python-multipart before 0.0.13 installs as `multipart`
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Plain form fields are small; anything bigger is not a form we sent
+MAX_FIELD_BYTES = 64 * 1024
+
+class InvalidUpload(Exception):
+    pass
+
+class UploadTooLarge(Exception):
+    pass
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in settings.ALLOWED_EXTENSIONS
+
+class StreamedUpload:
+    """A multipart upload parsed straight from the request stream.
+
+    The file part is written to UPLOAD_FOLDER as its bytes arrive, hashed with
+    SHA-256 and counted in the same pass, so nothing is spooled to a temp file
+    and memory stays at about one UPLOAD_CHUNK_SIZE buffer per upload. Plain
+    form fields are kept in `fields`.
+    """
+
+    def __init__(self, task_id: str, file_field: str = 'audio'):
+        self.task_id = task_id
+        self.file_field = file_field
+        self.filename = None
+        self.filepath = None
+        self.size = 0
+        self.sha256 = None
+        self.fields = {}
+        self._digest = hashlib.sha256()
+        self._out = None
+        self._buffer = bytearray()
+        # Parser callbacks are synchronous; they queue what the async loop does next
+        self._events = []
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._part = None
+
+    def _on_part_begin(self):
+        self._disposition = b""
+
+    def _on_header_field(self, data, start, end):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        name = options.get(b"name", b"").decode('utf-8', errors='replace')
+        if b"filename" in options:
+            if name != self.file_field or self.filename is not None:
+                raise InvalidUpload(f"Unexpected file field: {name}")
+            self._part = 'file'
+            self._events.append(('open', options[b"filename"].decode('utf-8', errors='replace')))
+        else:
+            self._part = name
+            self.fields[name] = b""
+
+    def _on_part_data(self, data, start, end):
+        if self._part == 'file':
+            self._events.append(('data', data[start:end]))
+        else:
+            value = self.fields[self._part] + data[start:end]
+            if len(value) > MAX_FIELD_BYTES:
+                raise InvalidUpload(f"Form field too large: {self._part}")
+            self.fields[self._part] = value
+
+    def _on_part_end(self):
+        self._part = None
+
+    async def _open(self, filename):
+        filename = os.path.basename(filename)
+        if not filename:
+            raise InvalidUpload("No file selected")
+        if not allowed_file(filename):
+            raise InvalidUpload("Invalid file type")
+        self.filename = filename
+        self.filepath = os.path.join(settings.UPLOAD_FOLDER, f"{self.task_id}_{filename}")
+        self._out = await aiofiles.open(self.filepath, 'wb')
+
+    async def _flush(self):
+        if self._buffer:
+            await self._out.write(bytes(self._buffer))
+            self._buffer.clear()
+
+    async def _handle_events(self):
+        for event, value in self._events:
+            if event == 'open':
+                await self._open(value)
+                continue
+            self.size += len(value)
+            if self.size > settings.MAX_UPLOAD_BYTES:
+                raise UploadTooLarge()
+            self._digest.update(value)
+            self._buffer += value
+            if len(self._buffer) >= settings.UPLOAD_CHUNK_SIZE:
+                await self._flush()
+        self._events.clear()
+
+    async def receive(self, request):
+        """Read and store the whole upload. On any error the partial file is deleted."""
+        _, params = parse_options_header(request.headers.get('content-type', ''))
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise InvalidUpload("Expected a multipart/form-data body")
+
+        parser = MultipartParser(boundary, {
+            'on_part_begin': self._on_part_begin,
+            'on_part_data': self._on_part_data,
+            'on_part_end': self._on_part_end,
+            'on_header_field': self._on_header_field,
+            'on_header_value': self._on_header_value,
+            'on_header_end': self._on_header_end,
+            'on_headers_finished': self._on_headers_finished,
+        })
+        try:
+            try:
+                async for chunk in request.stream():
+                    parser.write(chunk)
+                    await self._handle_events()
+                parser.finalize()
+            except FormParserError as e:
+                raise InvalidUpload(f"Invalid multipart data: {e}")
+            if self._out is None:
+                raise InvalidUpload("No file selected")
+            await self._flush()
+        except BaseException:
+            await self.discard()
+            raise
+        await self._out.close()
+        self._out = None
+        self.fields = {name: value.decode('utf-8', errors='replace') for name, value in self.fields.items()}
+        self.sha256 = self._digest.hexdigest()
+
+    async def discard(self):
+        if self._out is not None:
+            await self._out.close()
+            self._out = None
+        if self.filepath and os.path.exists(self.filepath):
+            os.remove(self.filepath)
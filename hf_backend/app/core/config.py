@@ -5,12 +5,49 @@ class Config:
     UPLOAD_FOLDER = 'uploads'
     TEMP_DIR = 'temp_dir'
     DATABASE_FILE = 'audio_captions.db'
+    # SQLite page cache per connection, busy wait and prepared statement cache size
+    DB_CACHE_KB = int(os.environ.get('DB_CACHE_KB', 16384))
+    DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+    DB_CACHED_STATEMENTS = 256
+    # WAL only works for processes on one host. When backends on several hosts share
+    # the database over a network volume, set DB_JOURNAL_MODE=DELETE.
+    DB_JOURNAL_MODE = os.environ.get('DB_JOURNAL_MODE', 'WAL').upper()
+    # Uploads are copied to disk UPLOAD_CHUNK_SIZE bytes at a time; larger than MAX_UPLOAD_BYTES is rejected
+    UPLOAD_CHUNK_SIZE = 1024 * 1024
+    MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 4 * 1024 ** 3))
     ALLOWED_EXTENSIONS = {'wav', 'mp3', 'flac', 'ogg', 'm4a', 'aac', 'mp4', 'mkv', 'avi', 'mov'}
     
     CWD = "./"
     PYTHON_PATH = "stt-transcribe"
     STT_MODEL_NAME = "parakeet"
+    # Seconds to wait after a worker error
     POLL_INTERVAL = 3
+    # An idle worker is woken by uploads; this is only the fallback check interval
+    IDLE_POLL_INTERVAL = int(os.environ.get('IDLE_POLL_INTERVAL', 60))
+    # Seconds between deletions of old tasks
+    CLEANUP_INTERVAL = int(os.environ.get('CLEANUP_INTERVAL', 3600))
+    # A claimed task is leased for LEASE_SECONDS and the worker renews the lease every
+    # HEARTBEAT_INTERVAL. Expired leases are re-queued, up to MAX_ATTEMPTS claims per task.
+    LEASE_SECONDS = int(os.environ.get('LEASE_SECONDS', 60))
+    HEARTBEAT_INTERVAL = int(os.environ.get('HEARTBEAT_INTERVAL', 15))
+    MAX_ATTEMPTS = int(os.environ.get('MAX_ATTEMPTS', 3))
+    # Seconds between checks for expired leases
+    REAPER_INTERVAL = int(os.environ.get('REAPER_INTERVAL', 30))
+    # /api/tasks page size: default and maximum `limit`
+    TASKS_PAGE_SIZE = 100
+    TASKS_MAX_PAGE_SIZE = 500
+    # Minimum seconds between progress writes for one task
+    PROGRESS_WRITE_INTERVAL = float(os.environ.get('PROGRESS_WRITE_INTERVAL', 1.0))
+    
+    # Tasks processed at the same time, each by its own worker loop
+    WORKER_CONCURRENCY = max(1, int(os.environ.get('WORKER_CONCURRENCY', 1)))
+    # Warm engine processes kept alive by the workers, one per worker by default
+    ENGINE_PROCESSES = int(os.environ.get('ENGINE_PROCESSES', WORKER_CONCURRENCY))
+    ENGINE_MAX_JOBS = int(os.environ.get('ENGINE_MAX_JOBS', 50))
+    ENGINE_STOP_TIMEOUT = 10
+    # Seconds one job may take before its engine process is killed as hung
+    ENGINE_JOB_TIMEOUT = int(os.environ.get('ENGINE_JOB_TIMEOUT', 3 * 3600))
+    ENGINE_STREAM_LIMIT = 64 * 1024 * 1024
 
 settings = Config()
 
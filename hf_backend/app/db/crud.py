@@ -1,160 +1,261 @@
-import aiosqlite
+import asyncio
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from app.core.config import settings
+from app.db.database import get_db
+from app.db.results import compress_result, decompress_result
 from custom_logger import logger_config as logger
 
-async def insert_task(task_id: str, filename: str, filepath: str, status: str, hide_from_ui: int):
-    async with aiosqlite.connect(settings.DATABASE_FILE) as db:
+def lease_time(seconds: float = 0) -> str:
+    """UTC timestamp `seconds` from now, so leases compare correctly between backends in different time zones."""
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat(timespec='microseconds')
+
+async def insert_task(task_id: str, filename: str, filepath: str, status: str, hide_from_ui: int, sha256: str = None):
+    async with get_db().write() as db:
         await db.execute('''INSERT INTO tasks 
-                     (id, filename, filepath, status, created_at, hide_from_ui)
-                     VALUES (?, ?, ?, ?, ?, ?)''',
-                  (task_id, filename, filepath, status, datetime.now().isoformat(), hide_from_ui))
-        await db.commit()
+                     (id, filename, filepath, status, created_at, hide_from_ui, sha256)
+                     VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                  (task_id, filename, filepath, status, datetime.now().isoformat(), hide_from_ui, sha256))
     logger.debug(f"Inserted task {filename} (ID: {task_id}) into database.")
 
-async def update_status(task_id: str, status: str, result: str = None, error: str = None):
-    async with aiosqlite.connect(settings.DATABASE_FILE) as db:
+async def update_status(task_id: str, status: str, result: str = None, error: str = None, owner: str = None) -> bool:
+    """Set a task's status. Returns False if nothing was updated.
+
+    With `owner`, the update only applies while `owner` still holds the task's lease,
+    so a worker whose task was re-queued can't overwrite the new owner's outcome.
+    """
+    if status == 'completed' and result is not None:
+        # Compressing a long transcript takes a while, keep it off the event loop
+        codec, blob = await asyncio.to_thread(compress_result, result)
+    lease_check = ' AND lease_owner = ?' if owner else ''
+    lease_params = (owner,) if owner else ()
+    async with get_db().write() as db:
         if status == 'completed':
-            await db.execute('''UPDATE tasks 
-                         SET status = ?, result = ?, processed_at = ?, progress = 100, progress_text = 'Completed'
-                         WHERE id = ?''',
-                      (status, result, datetime.now().isoformat(), task_id))
-            logger.info(f"Task ID {task_id} marked as completed.")
+            async with db.execute(f'''UPDATE tasks 
+                         SET status = ?, processed_at = ?, progress = 100, progress_text = 'Completed',
+                             lease_owner = NULL, lease_expires_at = NULL
+                         WHERE id = ?{lease_check}''',
+                      (status, datetime.now().isoformat(), task_id, *lease_params)) as cursor:
+                updated = cursor.rowcount > 0
+            if updated and result is not None:
+                await db.execute('INSERT OR REPLACE INTO task_results (task_id, codec, data, size) VALUES (?, ?, ?, ?)',
+                          (task_id, codec, blob, len(result)))
         elif status == 'failed':
-            await db.execute('''UPDATE tasks 
-                         SET status = ?, result = ?, processed_at = ?, progress_text = 'Failed'
-                         WHERE id = ?''',
-                      (status, f"Error: {error}", datetime.now().isoformat(), task_id))
-            logger.error(f"Task ID {task_id} marked as failed. Error: {error}")
+            async with db.execute(f'''UPDATE tasks 
+                         SET status = ?, result = ?, processed_at = ?, progress_text = 'Failed',
+                             lease_owner = NULL, lease_expires_at = NULL
+                         WHERE id = ?{lease_check}''',
+                      (status, f"Error: {error}", datetime.now().isoformat(), task_id, *lease_params)) as cursor:
+                updated = cursor.rowcount > 0
         else:
-            await db.execute('UPDATE tasks SET status = ? WHERE id = ?', (status, task_id))
-            logger.debug(f"Task ID {task_id} status updated to {status}.")
-        await db.commit()
-
-async def update_progress(task_id: str, progress: int, progress_text: str = None):
-    async with aiosqlite.connect(settings.DATABASE_FILE) as db:
-        await db.execute('UPDATE tasks SET progress = ?, progress_text = ? WHERE id = ?',
-                  (progress, progress_text, task_id))
-        await db.commit()
+            async with db.execute(f'UPDATE tasks SET status = ? WHERE id = ?{lease_check}',
+                      (status, task_id, *lease_params)) as cursor:
+                updated = cursor.rowcount > 0
+    if not updated:
+        logger.warning(f"Task ID {task_id} not marked as {status}, it is gone or its lease was lost.")
+    elif status == 'completed':
+        logger.info(f"Task ID {task_id} marked as completed.")
+    elif status == 'failed':
+        logger.error(f"Task ID {task_id} marked as failed. Error: {error}")
+    else:
+        logger.debug(f"Task ID {task_id} status updated to {status}.")
+    return updated
+
+async def update_progress(task_id: str, progress: int, progress_text: str = None, owner: str = None):
+    lease_check = ' AND lease_owner = ?' if owner else ''
+    async with get_db().write() as db:
+        await db.execute(f'UPDATE tasks SET progress = ?, progress_text = ? WHERE id = ?{lease_check}',
+                  (progress, progress_text, task_id, *((owner,) if owner else ())))
     logger.debug(f"Task ID {task_id} progress updated to {progress}% ({progress_text}).")
 
-async def get_next_not_started():
-    async with aiosqlite.connect(settings.DATABASE_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute('''SELECT * FROM tasks 
-                     WHERE status = 'not_started' 
-                     ORDER BY created_at ASC 
-                     LIMIT 1''') as cursor:
+async def claim_next_task(owner: str):
+    """Lease the oldest not-started task to `owner`, mark it processing and return it, or None.
+
+    Select and update are one statement, so concurrent workers never claim the same task.
+    """
+    async with get_db().write() as db:
+        async with db.execute('''UPDATE tasks 
+                     SET status = 'processing', lease_owner = ?, lease_expires_at = ?, 
+                         attempts = COALESCE(attempts, 0) + 1 
+                     WHERE id = (SELECT id FROM tasks 
+                                 WHERE status = 'not_started' 
+                                 ORDER BY created_at ASC 
+                                 LIMIT 1) 
+                     RETURNING *''', (owner, lease_time(settings.LEASE_SECONDS))) as cursor:
             return await cursor.fetchone()
 
+async def renew_lease(task_id: str, owner: str) -> bool:
+    """Extend `owner`'s lease on a task. False if the lease was lost to the reaper."""
+    async with get_db().write() as db:
+        async with db.execute('''UPDATE tasks SET lease_expires_at = ? 
+                     WHERE id = ? AND lease_owner = ? AND status = 'processing' ''',
+                  (lease_time(settings.LEASE_SECONDS), task_id, owner)) as cursor:
+            return cursor.rowcount > 0
+
+async def reap_expired_leases():
+    """Re-queue processing tasks whose lease expired, failing those out of attempts.
+
+    Tasks left processing without a lease (from before leases) count as expired.
+    Returns the number of re-queued tasks.
+    """
+    now = lease_time()
+    expired = "status = 'processing' AND (lease_expires_at IS NULL OR lease_expires_at < ?)"
+    async with get_db().write() as db:
+        async with db.execute(f'''UPDATE tasks 
+                     SET status = 'failed', result = ?, processed_at = ?, progress_text = 'Failed', 
+                         lease_owner = NULL, lease_expires_at = NULL 
+                     WHERE {expired} AND COALESCE(attempts, 0) >= ? 
+                     RETURNING id''',
+                  (f"Error: Worker stopped responding on all {settings.MAX_ATTEMPTS} attempts", datetime.now().isoformat(), now, settings.MAX_ATTEMPTS)) as cursor:
+            failed = await cursor.fetchall()
+        async with db.execute(f'''UPDATE tasks 
+                     SET status = 'not_started', progress = 0, progress_text = NULL, 
+                         lease_owner = NULL, lease_expires_at = NULL 
+                     WHERE {expired} 
+                     RETURNING id''', (now,)) as cursor:
+            requeued = await cursor.fetchall()
+    for row in failed:
+        logger.error(f"Task ID {row['id']} marked as failed, its lease expired {settings.MAX_ATTEMPTS} times.")
+    for row in requeued:
+        logger.warning(f"Task ID {row['id']} lease expired, re-queued.")
+    return len(requeued)
+
 async def cleanup_old_entries():
     try:
-        async with aiosqlite.connect(settings.DATABASE_FILE) as db:
-            db.row_factory = aiosqlite.Row
-            cutoff_date = (datetime.now() - timedelta(days=10)).isoformat()
+        cutoff_date = (datetime.now() - timedelta(days=10)).isoformat()
+        
+        async with get_db().reader.execute('''SELECT id, filepath FROM tasks 
+                     WHERE created_at < ?''', (cutoff_date,)) as cursor:
+            old_entries = await cursor.fetchall()
+        
+        if old_entries:
+            deleted_files = 0
+            deleted_rows = 0
             
-            async with db.execute('''SELECT id, filepath FROM tasks 
-                         WHERE created_at < ?''', (cutoff_date,)) as cursor:
-                old_entries = await cursor.fetchall()
+            for entry in old_entries:
+                filepath = entry['filepath']
+                if filepath and os.path.exists(filepath):
+                    try:
+                        os.remove(filepath)
+                        deleted_files += 1
+                    except Exception as e:
+                        logger.warning(f"Failed to delete old file {filepath}: {e}")
             
-            if old_entries:
-                deleted_files = 0
-                deleted_rows = 0
-                
-                for entry in old_entries:
-                    filepath = entry['filepath']
-                    if filepath and os.path.exists(filepath):
-                        try:
-                            os.remove(filepath)
-                            deleted_files += 1
-                        except Exception as e:
-                            logger.warning(f"Failed to delete old file {filepath}: {e}")
-                
-                # Use a separate execution for deletion to get rowcount correctly if needed, 
-                # or just run it. aiosqlite doesn't have cursor.rowcount directly on execute sometimes?
-                # Actually it does.
+            async with get_db().write() as db:
+                await db.execute('''DELETE FROM task_results 
+                             WHERE task_id IN (SELECT id FROM tasks WHERE created_at < ?)''', (cutoff_date,))
                 async with db.execute('''DELETE FROM tasks WHERE created_at < ?''', (cutoff_date,)) as cursor:
                     deleted_rows = cursor.rowcount
-                await db.commit()
-                
-                if deleted_rows > 0 or deleted_files > 0:
-                    logger.info(f"Cleanup: Deleted {deleted_rows} old entries and {deleted_files} files (older than 10 days)")
+            
+            if deleted_rows > 0 or deleted_files > 0:
+                logger.info(f"Cleanup: Deleted {deleted_rows} old entries and {deleted_files} files (older than 10 days)")
     except Exception as e:
         logger.error(f"Cleanup error: {e}")
 
 async def get_average_processing_time():
-    async with aiosqlite.connect(settings.DATABASE_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute('''SELECT created_at, processed_at FROM tasks 
-                          WHERE status = 'completed' AND processed_at IS NOT NULL
-                          ORDER BY processed_at DESC LIMIT 20''') as cursor:
-            completed_rows = await cursor.fetchall()
-        
-        if not completed_rows:
-            return 30.0
-        
-        total_seconds = 0
-        count = 0
-        for r in completed_rows:
-            try:
-                created = datetime.fromisoformat(r['created_at'])
-                processed = datetime.fromisoformat(r['processed_at'])
-                duration = (processed - created).total_seconds()
-                if duration > 0:
-                    total_seconds += duration
-                    count += 1
-            except:
-                continue
-        
-        return total_seconds / count if count > 0 else 30.0
+    async with get_db().reader.execute('''SELECT created_at, processed_at FROM tasks 
+                      WHERE status = 'completed' AND processed_at IS NOT NULL
+                      ORDER BY processed_at DESC LIMIT 20''') as cursor:
+        completed_rows = await cursor.fetchall()
+    
+    if not completed_rows:
+        return 30.0
+    
+    total_seconds = 0
+    count = 0
+    for r in completed_rows:
+        try:
+            created = datetime.fromisoformat(r['created_at'])
+            processed = datetime.fromisoformat(r['processed_at'])
+            duration = (processed - created).total_seconds()
+            if duration > 0:
+                total_seconds += duration
+                count += 1
+        except:
+            continue
+    
+    return total_seconds / count if count > 0 else 30.0
+
+def estimate_start_seconds(queue_position: int, processing_count: int, avg_time: float) -> int:
+    """Seconds until a queued task starts, with WORKER_CONCURRENCY tasks running at a time."""
+    tasks_ahead = queue_position - 1 + processing_count
+    return round(tasks_ahead // settings.WORKER_CONCURRENCY * avg_time)
+
+# Columns the task list shows; the result blob is only read by get_task_by_id
+LIST_COLUMNS = 'id, filename, status, created_at, processed_at, progress, progress_text'
+
+async def get_queue_positions():
+    """Map of not-started task id -> 1-based queue position, from one ordered index scan."""
+    async with get_db().reader.execute('''SELECT id FROM tasks 
+                 WHERE status = 'not_started' 
+                 ORDER BY created_at ASC''') as cursor:
+        return {row['id']: position for position, row in enumerate(await cursor.fetchall(), start=1)}
+
+async def get_processing_count():
+    """Processing tasks with a live lease; expired ones are waiting for the reaper."""
+    async with get_db().reader.execute('''SELECT COUNT(*) as count FROM tasks 
+                 WHERE status = 'processing' AND lease_expires_at >= ?''', (lease_time(),)) as cursor:
+        row = await cursor.fetchone()
+        return row['count']
 
-async def get_all_tasks():
-    async with aiosqlite.connect(settings.DATABASE_FILE) as db:
-        db.row_factory = aiosqlite.Row
+async def list_tasks(limit: int, after: tuple = None, statuses: list = None):
+    """One page of visible tasks, newest first.
+
+    `after` is the (created_at, id) of the last task of the previous page. Returns
+    the rows and the (created_at, id) to continue from, or None on the last page.
+    """
+    conditions = ['hide_from_ui = 0']
+    params = []
+    if statuses:
+        conditions.append(f"status IN ({', '.join('?' * len(statuses))})")
+        params.extend(statuses)
+    if after:
+        conditions.append('(created_at, id) < (?, ?)')
+        params.extend(after)
+
+    # One extra row tells whether there is a next page
+    async with get_db().reader.execute(f'''SELECT {LIST_COLUMNS} FROM tasks 
+                 WHERE {' AND '.join(conditions)} 
+                 ORDER BY created_at DESC, id DESC 
+                 LIMIT ?''', (*params, limit + 1)) as cursor:
+        rows = await cursor.fetchall()
+
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = (rows[-1]['created_at'], rows[-1]['id'])
+    return rows, next_after
+
+async def get_task_result(task_id: str):
+    """The stored result JSON of a completed task, or None."""
+    async with get_db().reader.execute('SELECT codec, data FROM task_results WHERE task_id = ?', (task_id,)) as cursor:
+        row = await cursor.fetchone()
+    if not row:
+        return None
+    return await asyncio.to_thread(decompress_result, row['codec'], row['data'])
+
+async def get_task_by_id(task_id: str):
+    db = get_db().reader
+    async with db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)) as cursor:
+        row = await cursor.fetchone()
         
+    if not row:
+        return None
+        
+    queue_position = None
+    estimated_start_seconds = None
+    
+    if row['status'] == 'not_started':
         avg_time = await get_average_processing_time()
         
-        async with db.execute('''SELECT id FROM tasks 
-                     WHERE status = 'not_started' 
-                     ORDER BY created_at ASC''') as cursor:
-            queue_ids = [row['id'] for row in await cursor.fetchall()]
+        async with db.execute('''SELECT COUNT(*) as position FROM tasks 
+                     WHERE status = 'not_started' AND created_at < ?''',
+                  (row['created_at'],)) as cursor:
+            position_row = await cursor.fetchone()
+            queue_position = position_row['position'] + 1
         
-        async with db.execute('''SELECT COUNT(*) as count FROM tasks WHERE status = 'processing' ''') as cursor:
-            row = await cursor.fetchone()
-            processing_count = row['count']
+        processing_count = await get_processing_count()
         
-        async with db.execute('SELECT * FROM tasks WHERE hide_from_ui = 0 OR hide_from_ui IS NULL ORDER BY created_at DESC') as cursor:
-            rows = await cursor.fetchall()
-            
-        return rows, queue_ids, processing_count, avg_time
-
-async def get_task_by_id(task_id: str):
-    async with aiosqlite.connect(settings.DATABASE_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)) as cursor:
-            row = await cursor.fetchone()
-            
-        if not row:
-            return None
-            
-        queue_position = None
-        estimated_start_seconds = None
+        estimated_start_seconds = estimate_start_seconds(queue_position, processing_count, avg_time)
         
-        if row['status'] == 'not_started':
-            avg_time = await get_average_processing_time()
-            
-            async with db.execute('''SELECT COUNT(*) as position FROM tasks 
-                         WHERE status = 'not_started' AND created_at < ?''',
-                      (row['created_at'],)) as cursor:
-                position_row = await cursor.fetchone()
-                queue_position = position_row['position'] + 1
-            
-            async with db.execute('''SELECT COUNT(*) as count FROM tasks WHERE status = 'processing' ''') as cursor:
-                count_row = await cursor.fetchone()
-                processing_count = count_row['count']
-            
-            tasks_ahead = queue_position - 1 + processing_count
-            estimated_start_seconds = round(tasks_ahead * avg_time)
-            
-        return row, queue_position, estimated_start_seconds
+    return row, queue_position, estimated_start_seconds
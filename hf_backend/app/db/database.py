@@ -1,11 +1,105 @@
+import asyncio
+from contextlib import asynccontextmanager
 import aiosqlite
 from app.core.config import settings
+from app.db.results import compress_result
 from custom_logger import logger_config as logger
 
+# Applied to both connections. WAL lets the reader see committed data while the
+# writer works, and synchronous=NORMAL is durable in WAL mode except for the
+# last transactions before a power loss. WAL needs shared memory between the
+# processes, so a database shared across hosts uses DB_JOURNAL_MODE=DELETE,
+# with full syncs and readers waiting on writers through busy_timeout.
+PRAGMAS = (
+    f"PRAGMA journal_mode = {settings.DB_JOURNAL_MODE}",
+    "PRAGMA synchronous = NORMAL" if settings.DB_JOURNAL_MODE == 'WAL' else "PRAGMA synchronous = FULL",
+    f"PRAGMA cache_size = -{settings.DB_CACHE_KB}",
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA busy_timeout = {settings.DB_BUSY_TIMEOUT_MS}",
+)
+
+# Columns added to tasks after its first release, created on existing databases by init_db
+TASK_COLUMN_MIGRATIONS = (
+    ('lease_owner', 'TEXT'),
+    ('lease_expires_at', 'TEXT'),
+    ('attempts', 'INTEGER DEFAULT 0'),
+    ('sha256', 'TEXT'),
+)
+
+class Database:
+    """One writer and one reader connection to the SQLite file, open for the app's lifetime.
+
+    All writes go through write(), which serializes transactions on the writer
+    connection and commits them (or rolls back on error). UI reads use the reader
+    connection, so polling clients never queue behind the worker's writes. Both
+    connections keep a statement cache, so the fixed SQL in crud is parsed once
+    and reused as a prepared statement.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.writer = None
+        self.reader = None
+        self._write_lock = asyncio.Lock()
+
+    async def _connect(self, read_only: bool = False):
+        db = await aiosqlite.connect(self.path, cached_statements=settings.DB_CACHED_STATEMENTS)
+        db.row_factory = aiosqlite.Row
+        for pragma in PRAGMAS:
+            await db.execute(pragma)
+        if read_only:
+            await db.execute("PRAGMA query_only = ON")
+        return db
+
+    async def connect(self):
+        # The writer goes first, switching the file to WAL before the reader opens it
+        self.writer = await self._connect()
+        self.reader = await self._connect(read_only=True)
+
+    async def close(self):
+        for db in (self.reader, self.writer):
+            if db is not None:
+                await db.close()
+        self.reader = None
+        self.writer = None
+
+    @asynccontextmanager
+    async def write(self):
+        """Run a write transaction on the writer connection."""
+        async with self._write_lock:
+            try:
+                yield self.writer
+                await self.writer.commit()
+            except BaseException:
+                await self.writer.rollback()
+                raise
+
+database = None
+
+def get_db() -> Database:
+    if database is None:
+        raise RuntimeError("Database is not connected, call connect_db() first")
+    return database
+
+async def connect_db():
+    global database
+    if database is None:
+        database = Database(settings.DATABASE_FILE)
+        await database.connect()
+        logger.info(f"Connected to database at {settings.DATABASE_FILE}")
+    return database
+
+async def close_db():
+    global database
+    if database is not None:
+        await database.close()
+        database = None
+
 async def init_db():
     logger.info(f"Initializing database at {settings.DATABASE_FILE}")
-    async with aiosqlite.connect(settings.DATABASE_FILE) as db:
-        await db.execute('''CREATE TABLE IF NOT EXISTS tasks
+    db = await connect_db()
+    async with db.write() as conn:
+        await conn.execute('''CREATE TABLE IF NOT EXISTS tasks
                      (id TEXT PRIMARY KEY,
                       filename TEXT NOT NULL,
                       filepath TEXT NOT NULL,
@@ -17,5 +111,44 @@ async def init_db():
                       progress_text TEXT,
                       hide_from_ui INTEGER DEFAULT 0)'''
         )
-        await db.commit()
+        async with conn.execute('PRAGMA table_info(tasks)') as cursor:
+            columns = {row['name'] for row in await cursor.fetchall()}
+        for name, definition in TASK_COLUMN_MIGRATIONS:
+            if name not in columns:
+                await conn.execute(f'ALTER TABLE tasks ADD COLUMN {name} {definition}')
+        # Rows from before hide_from_ui was always set; the list query relies on 0, not NULL
+        await conn.execute('UPDATE tasks SET hide_from_ui = 0 WHERE hide_from_ui IS NULL')
+        # Queue scans and counts by status, and the newest-first task list
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status_created ON tasks (status, created_at)')
+        # id breaks created_at ties, so the list's ORDER BY and cursor are served by the index alone
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_hide_created ON tasks (hide_from_ui, created_at, id)')
+        # Completed results live here, compressed, so task rows stay small
+        await conn.execute('''CREATE TABLE IF NOT EXISTS task_results
+                     (task_id TEXT PRIMARY KEY,
+                      codec TEXT NOT NULL,
+                      data BLOB NOT NULL,
+                      size INTEGER NOT NULL)'''
+        )
+    await migrate_results(db)
     logger.info("Database initialized successfully.")
+
+async def migrate_results(db: Database, batch_size: int = 50):
+    """Move completed results still stored inline in tasks.result to task_results."""
+    moved = 0
+    while True:
+        async with db.reader.execute('''SELECT id, result FROM tasks 
+                     WHERE status = 'completed' AND result IS NOT NULL 
+                     LIMIT ?''', (batch_size,)) as cursor:
+            rows = await cursor.fetchall()
+        if not rows:
+            break
+        compressed = [
+            (row['id'], *await asyncio.to_thread(compress_result, row['result']), len(row['result']))
+            for row in rows
+        ]
+        async with db.write() as conn:
+            await conn.executemany('INSERT OR REPLACE INTO task_results (task_id, codec, data, size) VALUES (?, ?, ?, ?)', compressed)
+            await conn.executemany('UPDATE tasks SET result = NULL WHERE id = ?', [(row['id'],) for row in rows])
+        moved += len(rows)
+    if moved:
+        logger.info(f"Moved {moved} results to the task_results table")
@@ -0,0 +1,28 @@
+import gzip
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# zstd when the zstandard package is installed, gzip otherwise. The codec is
+# stored with every result, so both kinds can be read back side by side.
+DEFAULT_CODEC = 'zstd' if zstandard else 'gzip'
+
+def compress_result(text: str, codec: str = DEFAULT_CODEC):
+    """Compress a result JSON string, returning (codec, blob)."""
+    data = text.encode('utf-8')
+    if codec == 'zstd':
+        return codec, zstandard.ZstdCompressor(level=3).compress(data)
+    return 'gzip', gzip.compress(data, compresslevel=6)
+
+def decompress_result(codec: str, blob: bytes) -> str:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Result is zstd compressed, install the zstandard package to read it")
+        data = zstandard.ZstdDecompressor().decompress(blob)
+    elif codec == 'gzip':
+        data = gzip.decompress(blob)
+    else:
+        raise ValueError(f"Unknown result codec: {codec}")
+    return data.decode('utf-8')
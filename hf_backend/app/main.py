@@ -3,7 +3,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.api.routes import router
-from app.db.database import init_db
+from app.api.upload_limit import UploadSizeLimit
+from app.core.config import settings
+from app.db.database import init_db, close_db
+from app.services.engine_pool import shutdown_engine_pool
+from app.services.worker import start_maintenance, stop_maintenance
 from custom_logger import logger_config as logger
 
 @asynccontextmanager
@@ -16,17 +20,25 @@ async def lifespan(app: FastAPI):
     logger.info("="*60)
     
     await init_db()
+    start_maintenance()
     yield
     logger.info("STT Backend API Server Shutting Down")
+    await stop_maintenance()
+    await shutdown_engine_pool()
+    await close_db()
 
 app = FastAPI(title="STT Backend API", version="2.0.0", lifespan=lifespan)
 
+# Added before CORS, so CORS wraps it and 413 answers carry the CORS headers too
+app.add_middleware(UploadSizeLimit, path="/api/tasks/upload", max_bytes=settings.MAX_UPLOAD_BYTES)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
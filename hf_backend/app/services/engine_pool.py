@@ -0,0 +1,217 @@
+import asyncio
+import os
+import json
+from app.core.config import settings
+from custom_logger import logger_config as logger
+
+class EngineCrashed(Exception):
+    pass
+
+class EngineTimeout(EngineCrashed):
+    pass
+
+class EngineProcess:
+    """A long-lived `stt-transcribe --server-mode --protocol jsonl` process.
+
+    The model is loaded once by the first job and reused by every following one.
+    Each job is one JSON request line on stdin and one JSON response line on
+    stdout carrying the result inline, preceded by progress lines that are handed
+    to the job's on_progress callback. Engine log output arrives on stderr and is
+    handed to the job's on_line callback as it arrives.
+    """
+
+    def __init__(self, index: int, slots: int = 1):
+        self.index = index
+        # Concurrent processes get disjoint CPU partitions (stt.resources)
+        self.slots = slots
+        # Each process writes its results to a private dir, so processes never
+        # overwrite each other's output_transcription.json
+        self.output_dir = os.path.abspath(os.path.join(settings.CWD, settings.TEMP_DIR, f"engine-{index}"))
+        self.process = None
+        self.jobs_done = 0
+        self._on_line = None
+        self._log_task = None
+
+    def is_alive(self):
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self):
+        command = [
+            settings.PYTHON_PATH,
+            '--server-mode',
+            '--protocol', 'jsonl',
+            '--model', settings.STT_MODEL_NAME,
+            '--output-dir', self.output_dir,
+        ]
+        logger.info(f"Starting engine process #{self.index}: {' '.join(command)}")
+        self.process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=settings.CWD,
+            # A response line holds the whole result, word timestamps included
+            limit=settings.ENGINE_STREAM_LIMIT,
+            env={
+                **os.environ,
+                'PYTHONUNBUFFERED': '1',
+                'CUDA_LAUNCH_BLOCKING': '1',
+                'USE_CPU_IF_POSSIBLE': 'true',
+                'STT_CPU_SLOT': str(self.index),
+                'STT_CPU_SLOTS': str(self.slots)
+            }
+        )
+        self.jobs_done = 0
+        self._log_task = asyncio.create_task(self._pump_logs(self.process))
+
+    async def _pump_logs(self, process):
+        while True:
+            try:
+                line = await process.stderr.readline()
+            except ValueError:
+                # Line longer than the stream limit, skip it
+                continue
+            if not line:
+                break
+            line_str = line.decode('utf-8', errors='replace').strip()
+            if not line_str:
+                continue
+            if self._on_line:
+                try:
+                    await self._on_line(line_str)
+                except Exception as e:
+                    logger.warning(f"Engine #{self.index} output handler failed: {e}")
+            else:
+                logger.debug(f"[STT #{self.index}] {line_str}")
+
+    async def stop(self, kill: bool = False):
+        """Stop the process: ask it to exit, or kill it right away when it's mid-job."""
+        if self.process is None:
+            return
+        process = self.process
+        self.process = None
+        if process.returncode is None and kill:
+            logger.warning(f"Killing engine process #{self.index} (pid {process.pid})")
+            process.kill()
+            await process.wait()
+        elif process.returncode is None:
+            logger.info(f"Stopping engine process #{self.index} (pid {process.pid})")
+            try:
+                # An empty line ends the server loop cleanly.
+                process.stdin.write(b"\n")
+                await process.stdin.drain()
+                process.stdin.close()
+                await asyncio.wait_for(process.wait(), timeout=settings.ENGINE_STOP_TIMEOUT)
+            except (asyncio.TimeoutError, ConnectionError, BrokenPipeError):
+                logger.warning(f"Engine process #{self.index} did not exit, killing it")
+                process.kill()
+                await process.wait()
+        if self._log_task:
+            self._log_task.cancel()
+            self._log_task = None
+
+    async def run(self, job_id: str, filepath: str, on_line=None, on_progress=None) -> dict:
+        """Run one job and return the engine's response.
+
+        The response has "status" ("ok" or "error"), "result", "timings" and "error".
+        Raises EngineCrashed if the process dies before answering, and EngineTimeout
+        (killing the process) if it takes longer than ENGINE_JOB_TIMEOUT.
+        """
+        if not self.is_alive():
+            if self.process is not None:
+                logger.warning(f"Engine process #{self.index} exited with code {self.process.returncode}, restarting")
+                await self.stop()
+            await self.start()
+
+        request = {
+            "id": job_id,
+            "input": os.path.abspath(filepath),
+            "inline_result": True,
+        }
+        try:
+            self.process.stdin.write((json.dumps(request) + "\n").encode('utf-8'))
+            await self.process.stdin.drain()
+        except (ConnectionError, BrokenPipeError) as e:
+            await self.stop()
+            raise EngineCrashed(f"Engine process #{self.index} is not accepting jobs: {e}")
+
+        self._on_line = on_line
+        try:
+            response = await asyncio.wait_for(self._read_response(job_id, on_progress), timeout=settings.ENGINE_JOB_TIMEOUT)
+        except asyncio.TimeoutError:
+            # A hung engine never answers; kill it so the next job gets a fresh one
+            await self.stop(kill=True)
+            raise EngineTimeout(f"Engine process #{self.index} did not finish the job within {settings.ENGINE_JOB_TIMEOUT}s")
+        except asyncio.CancelledError:
+            # The engine is still busy with the abandoned job
+            await self.stop(kill=True)
+            raise
+        finally:
+            self._on_line = None
+
+        self.jobs_done += 1
+        if self.jobs_done >= settings.ENGINE_MAX_JOBS:
+            logger.info(f"Engine process #{self.index} reached {self.jobs_done} jobs, recycling")
+            await self.stop()
+
+        return response
+
+    async def _read_response(self, job_id: str, on_progress=None) -> dict:
+        """Read stdout up to the job's response line, handing progress lines to on_progress."""
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                returncode = await self.process.wait()
+                await self.stop()
+                raise EngineCrashed(f"Engine process #{self.index} exited with code {returncode}")
+
+            try:
+                response = json.loads(line)
+            except ValueError:
+                logger.warning(f"Engine #{self.index} sent a non-protocol line: {line[:200]!r}")
+                continue
+            if response.get("id") != job_id:
+                continue
+            if response.get("type") == "progress":
+                if on_progress:
+                    try:
+                        await on_progress(response)
+                    except Exception as e:
+                        logger.warning(f"Engine #{self.index} progress handler failed: {e}")
+                continue
+            return response
+
+class EnginePool:
+    """Fixed-size set of warm engine processes, handed out one job at a time."""
+
+    def __init__(self, size: int):
+        self.engines = [EngineProcess(i, size) for i in range(size)]
+        self._idle = asyncio.Queue()
+        for engine in self.engines:
+            self._idle.put_nowait(engine)
+
+    async def run(self, job_id: str, filepath: str, on_line=None, on_progress=None) -> dict:
+        """Run one job on the next idle engine and return its response."""
+        engine = await self._idle.get()
+        try:
+            return await engine.run(job_id, filepath, on_line, on_progress)
+        finally:
+            self._idle.put_nowait(engine)
+
+    async def shutdown(self):
+        for engine in self.engines:
+            await engine.stop()
+
+engine_pool = None
+
+def get_engine_pool():
+    global engine_pool
+    if engine_pool is None:
+        engine_pool = EnginePool(settings.ENGINE_PROCESSES)
+    return engine_pool
+
+async def shutdown_engine_pool():
+    global engine_pool
+    if engine_pool is not None:
+        await engine_pool.shutdown()
+        engine_pool = None
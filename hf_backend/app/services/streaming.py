@@ -23,8 +23,18 @@ def _acquire_model(model_name, device):
         entry = _MODEL_CACHE.get(key)
         if entry is None:
             from faster_whisper import WhisperModel
-            compute = "int8" if device == "cpu" else "float16"
-            model = WhisperModel(model_name, device=device, compute_type=compute)
+            from stt.autotune import load_profile
+            # Tuned per host with `stt-transcribe --autotune --model-name <model>`
+            profile = load_profile(model_name, device) or {
+                "compute_type": "int8" if device == "cpu" else "float16",
+                "cpu_threads": 0,
+            }
+            model = WhisperModel(
+                model_name,
+                device=device,
+                compute_type=profile["compute_type"],
+                cpu_threads=profile["cpu_threads"],
+            )
             entry = {"model": model, "refs": 0}
             _MODEL_CACHE[key] = entry
         entry["refs"] += 1
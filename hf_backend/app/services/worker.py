@@ -1,155 +1,247 @@
 import asyncio
 import os
 import json
-import shlex
-import re
+import socket
 from app.core.config import settings
 from custom_logger import logger_config as logger
 from app.db import crud
+from app.services.engine_pool import get_engine_pool
 
-worker_task = None
+worker_tasks = []
 worker_running = False
+maintenance_tasks = []
+# Lease owner prefix, unique across backend processes sharing the database
+# (on several hosts that needs DB_JOURNAL_MODE=DELETE, see config)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+# Set when a task is queued, so idle workers pick it up without polling
+work_available = asyncio.Event()
 
 def is_worker_running():
     return worker_running
 
+def notify_worker():
+    """Wake the idle workers up, a new task is waiting."""
+    work_available.set()
+
 async def start_worker():
-    global worker_task, worker_running
+    global worker_running
     
     logger.info(f"start_worker called: worker_running={worker_running}")
     
     if not worker_running:
         worker_running = True
-        worker_task = asyncio.create_task(worker_loop())
-        logger.info("Worker task started")
+        # Each loop runs one task at a time on its own engine process
+        worker_tasks[:] = [
+            asyncio.create_task(worker_loop(index))
+            for index in range(settings.WORKER_CONCURRENCY)
+        ]
+        logger.info(f"{len(worker_tasks)} worker task(s) started")
     else:
         logger.info("Worker already running")
 
-async def worker_loop():
-    global worker_running
-    logger.info("STT Worker started. Monitoring for new audio files...")
+async def cleanup_loop():
+    """Delete old tasks and their files every CLEANUP_INTERVAL seconds."""
+    while True:
+        await crud.cleanup_old_entries()
+        await asyncio.sleep(settings.CLEANUP_INTERVAL)
+
+async def reaper_loop():
+    """Re-queue tasks whose worker stopped renewing the lease, every REAPER_INTERVAL seconds."""
+    while True:
+        try:
+            if await crud.reap_expired_leases():
+                await start_worker()
+                notify_worker()
+        except Exception as e:
+            logger.error(f"Lease reaper error: {e}")
+        await asyncio.sleep(settings.REAPER_INTERVAL)
+
+def start_maintenance():
+    if not maintenance_tasks:
+        maintenance_tasks.extend([
+            asyncio.create_task(cleanup_loop()),
+            asyncio.create_task(reaper_loop()),
+        ])
+
+async def stop_maintenance():
+    for task in maintenance_tasks:
+        task.cancel()
+    await asyncio.gather(*maintenance_tasks, return_exceptions=True)
+    maintenance_tasks.clear()
+
+async def heartbeat(task_id, owner, job):
+    """Renew the task's lease until cancelled. Cancels `job` once the lease is lost."""
+    while True:
+        await asyncio.sleep(settings.HEARTBEAT_INTERVAL)
+        try:
+            renewed = await crud.renew_lease(task_id, owner)
+        except Exception as e:
+            logger.warning(f"Failed to renew the lease on task {task_id}: {e}")
+            continue
+        if not renewed:
+            logger.warning(f"Lost the lease on task {task_id}, abandoning it")
+            job.cancel()
+            return
+
+# Overall progress (%) at the start of each engine stage; transcription fills 30-90%
+STAGE_PROGRESS = {
+    'decode': (15, "Extracting audio..."),
+    'cached': (90, "Loading cached result..."),
+    'load': (25, "Loading model..."),
+    'transcribe': (30, "Transcribing..."),
+    'save': (95, "Saving data..."),
+}
+
+class ProgressReporter:
+    """Turns the engine's progress events into throttled progress writes for one task.
+
+    At most one write per PROGRESS_WRITE_INTERVAL seconds reaches the database.
+    Events in between only replace the pending update, which is written when the
+    interval is up, so the last state before a pause is never lost.
+    """
+
+    def __init__(self, task_id, owner=None):
+        self.task_id = task_id
+        self.owner = owner
+        self.interval = settings.PROGRESS_WRITE_INTERVAL
+        self.progress = 0
+        self.pending = None
+        self.last_write = 0.0
+        self._flush_task = None
+        self._writing = False
+
+    async def update(self, progress, text):
+        # Never move the bar backwards
+        self.progress = max(self.progress, progress)
+        self.pending = (self.progress, text)
+        wait = self.last_write + self.interval - asyncio.get_running_loop().time()
+        if wait <= 0:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later(wait))
+
+    async def _flush_later(self, wait):
+        try:
+            await asyncio.sleep(wait)
+            await self.flush()
+        finally:
+            self._flush_task = None
+
+    async def flush(self):
+        if self.pending is None:
+            return
+        progress, text = self.pending
+        self.pending = None
+        self.last_write = asyncio.get_running_loop().time()
+        self._writing = True
+        try:
+            await crud.update_progress(self.task_id, progress, text, self.owner)
+        finally:
+            self._writing = False
+
+    async def close(self):
+        """Drop any pending update, the task's final status is written next.
+
+        A write already under way is awaited, so it can't land after the final status.
+        """
+        self.pending = None
+        task = self._flush_task
+        if task is None:
+            return
+        if not self._writing:
+            task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    async def on_progress(self, event):
+        stage = event.get('stage')
+        if stage not in STAGE_PROGRESS:
+            return
+        progress, text = STAGE_PROGRESS[stage]
+        if stage == 'transcribe':
+            progress += int(60 * (event.get('fraction') or 0))
+            if event.get('chunks'):
+                text = f"Transcribing... (Chunk {event['chunk']}/{event['chunks']})"
+        await self.update(progress, text)
+
+async def log_engine_output(line_str):
+    logger.info(f"[STT] {line_str}")
+
+async def process_task(row, owner):
+    """Run one claimed task on the engine pool and store its outcome, if `owner` still holds the lease."""
+    task_id = row['id']
+    filepath = row['filepath']
+    filename = row['filename']
+    
+    reporter = ProgressReporter(task_id, owner)
+    try:
+        await reporter.update(5, "Starting STT...")
+        
+        logger.debug(f"Sending job to engine pool: {filepath}")
+        
+        try:
+            response = await get_engine_pool().run(
+                task_id, filepath,
+                on_line=log_engine_output,
+                on_progress=reporter.on_progress
+            )
+        finally:
+            await reporter.close()
+        if response.get('status') != 'ok':
+            raise Exception(response.get('error') or "STT engine reported an error")
+        
+        result = response['result']
+        logger.debug(f"Engine timings for {task_id}: {response.get('timings')}")
+        
+        # Extract result text (caption)
+        result_data = result.get('text', '') or result.get('transcription', '') or str(result)
+        
+        logger.success(f"Successfully processed: {filename}")
+        logger.info(f"Text preview: {result_data[:100]}...")
+        
+        # The audio file stays for the new owner if the task was re-queued meanwhile
+        if await crud.update_status(task_id, 'completed', result=json.dumps(result), owner=owner):
+            if os.path.exists(filepath):
+                os.remove(filepath)
+                logger.debug(f"Deleted audio file: {filepath}")
+        
+    except Exception as e:
+        logger.error(f"Failed to process {filename}: {str(e)}")
+        await crud.update_status(task_id, 'failed', error=str(e), owner=owner)
+
+async def worker_loop(index: int = 0):
+    owner = f"{WORKER_ID}#{index}"
+    logger.info(f"STT Worker {owner} started. Monitoring for new audio files...")
     
     while worker_running:
-        logger.debug("Worker loop iteration, checking for files...")
-        await crud.cleanup_old_entries()
+        logger.debug(f"Worker {owner} loop iteration, checking for files...")
         
         try:
-            row = await crud.get_next_not_started()
+            # Cleared before claiming, so a task queued after the claim still wakes us
+            work_available.clear()
+            row = await crud.claim_next_task(owner)
             
             if row:
-                task_id = row['id']
-                filepath = row['filepath']
-                filename = row['filename']
-                
-                logger.info(f"\n{'='*60}\nProcessing: {filename}\nID: {task_id}\n{'='*60}")
-                
-                await crud.update_status(task_id, 'processing')
+                logger.info(f"\n{'='*60}\nWorker {owner} processing: {row['filename']}\nID: {row['id']}\n{'='*60}")
                 
+                job = asyncio.create_task(process_task(row, owner))
+                lease = asyncio.create_task(heartbeat(row['id'], owner, job))
                 try:
-                    await crud.update_progress(task_id, 5, "Starting STT...")
-                    
-                    command = f"cd {settings.CWD} && {settings.PYTHON_PATH} --input {shlex.quote(os.path.abspath(filepath))} --model {settings.STT_MODEL_NAME}"
-                    
-                    logger.debug(f"Executing command: {command}")
-                    
-                    process = await asyncio.create_subprocess_shell(
-                        command,
-                        stdout=asyncio.subprocess.PIPE,
-                        stderr=asyncio.subprocess.STDOUT,
-                        cwd=settings.CWD,
-                        env={
-                            **os.environ,
-                            'PYTHONUNBUFFERED': '1',
-                            'CUDA_LAUNCH_BLOCKING': '1',
-                            'USE_CPU_IF_POSSIBLE': 'true'
-                        }
-                    )
-                    
-                    current_chunk = 1
-                    total_chunks = 1
-                    
-                    while True:
-                        line = await process.stdout.readline()
-                        if not line:
-                            break
-                            
-                        line_str = line.decode('utf-8', errors='replace').strip()
-                        if line_str:
-                            logger.info(f"[STT] {line_str}")
-                            
-                            # Track chunk progress
-                            chunk_match = re.search(r'Processing chunk (\d+)/(\d+)', line_str)
-                            if chunk_match:
-                                try:
-                                    current_chunk = int(chunk_match.group(1))
-                                    total_chunks = int(chunk_match.group(2))
-                                except: pass
-                            
-                            # Generic percentage matcher
-                            percent_match = re.search(r'(\d+)%', line_str)
-                            if percent_match:
-                                try:
-                                    percent = int(percent_match.group(1))
-                                    if 'audio' in line_str.lower() or 'extract' in line_str.lower():
-                                        await crud.update_progress(task_id, percent // 2, "Extracting audio...")
-                                    elif 'transcrib' in line_str.lower() or 'model' in line_str.lower():
-                                        # Calculate overall transcription progress based on chunks
-                                        chunk_base = ((current_chunk - 1) / total_chunks) * 100
-                                        chunk_progress = (percent / total_chunks)
-                                        overall_transcription_progress = chunk_base + chunk_progress
-                                        
-                                        # Remap so 50-100% of the overall bar is transcription
-                                        overall_progress = int(50 + (overall_transcription_progress / 2))
-                                        await crud.update_progress(task_id, overall_progress, f"Transcribing... (Chunk {current_chunk}/{total_chunks})")
-                                    else:
-                                        await crud.update_progress(task_id, percent, "Processing...")
-                                except: pass
-                                
-                            # Stage matchers
-                            if 'initializing nemo asr' in line_str.lower():
-                                await crud.update_progress(task_id, 10, "Initializing engine...")
-                            elif 'extracting audio' in line_str.lower():
-                                await crud.update_progress(task_id, 15, "Extracting audio...")
-                            elif 'model loaded' in line_str.lower():
-                                await crud.update_progress(task_id, 25, "Model loaded...")
-                            elif 'processing audio duration' in line_str.lower():
-                                await crud.update_progress(task_id, 35, "Analyzing audio...")
-                            elif 'transcription started' in line_str.lower() and total_chunks == 1:
-                                await crud.update_progress(task_id, 50, "Transcribing started...")
-                            elif 'transcription completed successfully' in line_str.lower():
-                                await crud.update_progress(task_id, 90, "Transcription finished.")
-                            elif 'json transcription saved' in line_str.lower():
-                                await crud.update_progress(task_id, 95, "Saving data...")
-                    
-                    await process.wait()
-                    if process.returncode != 0:
-                        raise Exception(f"STT process failed with return code {process.returncode}")
-                    
-                    await crud.update_progress(task_id, 98, "Reading results...")
-                    
-                    output_path = os.path.join(settings.CWD, settings.TEMP_DIR, 'output_transcription.json')
-                    with open(output_path, 'r') as file:
-                        result = json.loads(file.read().strip())
-                    
-                    # Extract result text (caption)
-                    result_data = result.get('text', '') or result.get('transcription', '') or str(result)
-                    
-                    logger.success(f"Successfully processed: {filename}")
-                    logger.info(f"Text preview: {result_data[:100]}...")
-                    
-                    await crud.update_status(task_id, 'completed', result=json.dumps(result))
-                    
-                    if os.path.exists(filepath):
-                        os.remove(filepath)
-                        logger.debug(f"Deleted audio file: {filepath}")
-                    
-                except Exception as e:
-                    logger.error(f"Failed to process {filename}: {str(e)}")
-                    await crud.update_status(task_id, 'failed', error=str(e))
+                    await asyncio.wait({job})
+                finally:
+                    lease.cancel()
+                    job.cancel()
+                if job.cancelled():
+                    logger.warning(f"Dropped task {row['id']}, its lease was lost")
+                else:
+                    job.result()
                     
             else:
-                await asyncio.sleep(settings.POLL_INTERVAL)
+                # Uploads wake the worker; the timeout only catches tasks queued some other way
+                try:
+                    await asyncio.wait_for(work_available.wait(), timeout=settings.IDLE_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
                 
         except Exception as e:
-            logger.error(f"Worker error: {str(e)}")
+            logger.error(f"Worker {owner} error: {str(e)}")
             await asyncio.sleep(settings.POLL_INTERVAL)
@@ -0,0 +1,132 @@
+"""Per-host tuning of faster-whisper's compute_type, cpu_threads and num_workers.
+
+A short clip is transcribed with every candidate compute type and thread count,
+and the fastest one is stored per (host, device, model) in a JSON profile file,
+which the engines read when they load a model. num_workers is derived from the
+winner: as many workers as fit in the inference partition (see stt.resources)
+without oversubscribing it. Tuning runs pinned to that partition, the same CPUs
+the engines later load the model on.
+
+	stt-transcribe --autotune --model-name small
+"""
+import os
+import json
+import time
+import socket
+import tempfile
+
+from . import common, resources
+
+PROFILE_FILE = os.getenv("STT_AUTOTUNE_FILE") or os.path.join(os.path.expanduser("~"), ".cache", "stt-runner", "autotune.json")
+CLIP_SECONDS = 30
+
+def is_enabled():
+	"""Tune on model load when no profile exists yet (STT_AUTOTUNE=1)."""
+	return os.getenv("STT_AUTOTUNE", "0").lower() in ("1", "true", "yes", "on")
+
+def profile_key(model_name, device):
+	return f"{socket.gethostname()}|{device}|{model_name}"
+
+def _read_profiles():
+	try:
+		with open(PROFILE_FILE, 'r', encoding='utf-8') as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+def load_profile(model_name, device):
+	return _read_profiles().get(profile_key(model_name, device))
+
+def save_profile(model_name, device, profile):
+	profiles = _read_profiles()
+	profiles[profile_key(model_name, device)] = profile
+	os.makedirs(os.path.dirname(PROFILE_FILE), exist_ok=True)
+	fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(PROFILE_FILE), suffix=".tmp")
+	with os.fdopen(fd, 'w', encoding='utf-8') as f:
+		json.dump(profiles, f, indent=4)
+	os.replace(temp_path, PROFILE_FILE)
+
+def find_clip():
+	candidates = [
+		os.getenv("STT_AUTOTUNE_CLIP"),
+		# Bundled clip in a source checkout
+		os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.wav"),
+		"test.wav",
+	]
+	for path in candidates:
+		if path and os.path.exists(path):
+			return path
+	raise FileNotFoundError("No benchmark clip found, set STT_AUTOTUNE_CLIP to a short audio file")
+
+def candidates(device):
+	"""(compute_type, cpu_threads) pairs worth trying on this device."""
+	if device == "cuda":
+		return [(compute_type, 0) for compute_type in ("float16", "int8_float16", "int8")]
+
+	cores = resources.get_plan().inference_threads
+	thread_counts = sorted({cores, max(1, cores // 2), max(1, cores // 4)}, reverse=True)
+	return [
+		(compute_type, threads)
+		for compute_type in ("int8", "int8_float32", "float32")
+		for threads in thread_counts
+	]
+
+def _benchmark(model_name, device, compute_type, cpu_threads, audio):
+	from faster_whisper import WhisperModel
+	model = WhisperModel(model_name, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+	try:
+		# The first run pays one-off allocation costs, time the second one
+		for _ in range(2):
+			started = time.perf_counter()
+			segments, _ = model.transcribe(audio, beam_size=1)
+			for _ in segments:
+				pass
+			elapsed = time.perf_counter() - started
+		return elapsed
+	finally:
+		del model
+
+def autotune(model_name, device, clip=None):
+	"""Benchmark every candidate, save the fastest profile and return it."""
+	# Pin first, so the CLI measures the same CPUs a loaded engine gets
+	resources.apply_inference_plan()
+	clip = clip or find_clip()
+	audio = common.decode_audio(clip)[:CLIP_SECONDS * 16000]
+	audio_seconds = len(audio) / 16000
+	print(f"Auto-tuning {model_name} on {device} with {audio_seconds:.1f}s of {clip}")
+
+	results = []
+	for compute_type, cpu_threads in candidates(device):
+		try:
+			seconds = _benchmark(model_name, device, compute_type, cpu_threads, audio)
+		except (ValueError, RuntimeError) as e:
+			# Compute type not supported on this hardware
+			print(f"  {compute_type:<14} threads={cpu_threads:<3} unsupported: {e}")
+			continue
+		print(f"  {compute_type:<14} threads={cpu_threads:<3} {seconds:.2f}s")
+		results.append((seconds, compute_type, cpu_threads))
+
+	if not results:
+		raise RuntimeError(f"No compute type could run {model_name} on {device}")
+
+	seconds, compute_type, cpu_threads = min(results)
+	num_workers = max(1, resources.get_plan().inference_threads // cpu_threads) if cpu_threads else 1
+	profile = {
+		"compute_type": compute_type,
+		"cpu_threads": cpu_threads,
+		"num_workers": num_workers,
+		"seconds": round(seconds, 3),
+		"rtf": round(seconds / audio_seconds, 4),
+		"clip": os.path.abspath(clip),
+		"tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+	}
+	save_profile(model_name, device, profile)
+	print(f"Saved profile for {profile_key(model_name, device)}: {compute_type}, {cpu_threads} threads, {num_workers} workers")
+	return profile
+
+def get_profile(model_name, device, tune=False):
+	"""Stored profile for this host, tuning first if asked to and none exists."""
+	profile = load_profile(model_name, device)
+	if profile is None and tune:
+		profile = autotune(model_name, device)
+	return profile
@@ -1,42 +1,87 @@
-from pathlib import Path
 import os
 import json
-from . import common
-import ffmpeg
+from . import common, instrument, resources
+from .cache import TranscriptionCache
+from .writers import SegmentWriter, parse_formats
 import gc
 
-from dotenv import load_dotenv
-import os
-if os.path.exists(".env"):
-    print("Loaded load_dotenv")
-    load_dotenv()
+_ENV_LOADED = False
+
+def load_env():
+	"""Load ./.env once per process, at runner startup or when the first engine is created."""
+	global _ENV_LOADED
+	if _ENV_LOADED:
+		return
+	_ENV_LOADED = True
+	if os.path.exists(".env"):
+		from dotenv import load_dotenv
+		print("Loaded load_dotenv")
+		load_dotenv()
 
 class BaseSTT:
 	"""Base class for speech-to-text implementations"""
+
+	OUTPUT_TEXT_FILE = "output_transcription.txt"
+	OUTPUT_JSON_FILE = "output_transcription.json"
+	# Engines that can hand segments to a SegmentWriter while decoding
+	supports_streaming = False
+	# Model used when none is requested
+	default_model_name = None
 	
 	def __init__(self, type):
-		self.device = common.get_device()
+		load_env()
+		# Resolved on first use, see the device property
+		self._device = None
 		os.environ["TORCH_USE_CUDA_DSA"] = "1"
 		os.environ["CUDA_LAUNCH_BLOCKING"] = "1"
 		os.environ["HF_HUB_TIMEOUT"] = "120"
 		self.type = type
 		self.input_file = None
-		# self.temp_dir = os.path.abspath(os.path.realpath(os.path.join(os.path.dirname(__file__), "./temp_dir")))
-		self.temp_dir = "./temp_dir"
-		self.output_text_file = f"{self.temp_dir}/output_transcription.txt"
-		self.output_json_file = f"{self.temp_dir}/output_transcription.json"
+		# Default output location, used when a job doesn't ask for its own output_dir
+		self.output_dir = "./temp_dir"
+		self.cache = TranscriptionCache()
 		self.model = None
+		# Bytes the model took when it was last loaded, used by ModelManager
+		self.model_footprint = 0
 		self.default_language = None
+		self.sample_rate = 16000
+
+	@property
+	def device(self):
+		if self._device is None:
+			self._device = common.get_device()
+		return self._device
+
+	@device.setter
+	def device(self, value):
+		self._device = value
+
+	def _ensure_model(self):
+		"""Load the model on first use, so cache hits never import the engine."""
+		if self.model is None:
+			resources.apply_inference_plan()
+			with instrument.stage("load", engine=self.type, model=getattr(self, "model_name", None)) as fields:
+				before = common.get_memory_usage(self.device)
+				self._load_model()
+				self.model_footprint = max(0, common.get_memory_usage(self.device) - before)
+				fields["bytes"] = self.model_footprint
+
+	def _load_model(self):
+		raise NotImplementedError("Subclasses must implement _load_model method")
 
 	def reset(self):
-		if self.device == "cuda":
+		if self._device == "cuda":
 			import torch
 			torch.cuda.empty_cache()
 			torch.cuda.synchronize()
-		if os.path.exists(self.temp_dir):
-			import shutil
-			shutil.rmtree(self.temp_dir)
-		os.makedirs(self.temp_dir, exist_ok=True)
+
+	def _get_arg(self, args, name, default=None):
+		value = args.get(name) if isinstance(args, dict) else getattr(args, name, None)
+		return default if value is None else value
+
+	def cache_options(self):
+		"""Engine settings that change the transcription output, used in the cache key."""
+		return {}
 
 	def validate_input_file(self, file_path):
 		if not file_path or not os.path.exists(file_path):
@@ -52,112 +97,185 @@ class BaseSTT:
 		audio_extensions = ('.wav', '.flac', '.mp3', '.m4a', '.aac', '.ogg', '.wma')
 		return file_path.lower().endswith(audio_extensions)
 	
-	def _extract_audio_from_video(self, video_path: str) -> str:
-		temp_audio_path = f'{self.temp_dir}/input.wav'
-
-		try:
-			print(f"Trying to extract English audio from: {video_path}")
-
-			# Attempt to extract only English audio stream
-			cmd = [
-				'ffmpeg',
-				'-i', video_path,
-				'-map', '0:a:0',
-				'-vn',
-				'-acodec', 'pcm_s16le',
-				'-ac', '1',
-				'-ar', '16000',
-				'-y',
-				temp_audio_path
-			]
-			common.run_ffmpeg(cmd)
-			
-			if Path(temp_audio_path).exists() and Path(temp_audio_path).stat().st_size > 0:
-				print(f"✅ English audio extracted to: {temp_audio_path}")
-				return temp_audio_path
-			else:
-				raise Exception("English audio stream not found or empty.")
-
-		except Exception as e:
-			print(f"⚠️ English audio not found, falling back to default audio stream. Reason: {e}")
-
-			# Fallback: extract default audio stream (usually stream index 0:1)
-			cmd = [
-				'ffmpeg',
-				'-i', video_path,
-				'-map', '0:a:0',
-				'-vn',
-				'-acodec', 'pcm_s16le',
-				'-ac', '1',
-				'-ar', '16000',
-				'-y',
-				temp_audio_path
-			]
-			common.run_ffmpeg(cmd)
-
-			print(f"✅ Fallback audio extracted to: {temp_audio_path}")
-			return temp_audio_path
-
-	def save_transcription_results(self, result):
+	def _decode_audio(self, input_file: str):
+		"""Decode input_file to a mono float32 array at self.sample_rate."""
+		print(f"Extracting audio from: {input_file}")
+		instrument.progress("decode")
+		with instrument.stage("decode", bytes=os.path.getsize(input_file)) as fields:
+			audio = common.decode_audio(input_file, self.sample_rate)
+			fields["audio_seconds"] = audio.size / self.sample_rate
+		if audio.size == 0:
+			raise ValueError(f"No audio stream found in: {input_file}")
+
+		print(f"✅ Decoded {audio.size / self.sample_rate:.2f}s of audio")
+		return audio
+
+	def save_transcription_results(self, result, output_dir=None):
 		"""Save transcription results to files.
 		
 		Args:
 			result: Dictionary containing transcription results
+			output_dir: Directory to write into, defaults to self.output_dir
 			
 		Returns:
 			True if successful, False otherwise
 		"""
+		output_dir = output_dir or self.output_dir
+		os.makedirs(output_dir, exist_ok=True)
+		output_text_file = os.path.join(output_dir, self.OUTPUT_TEXT_FILE)
+		output_json_file = os.path.join(output_dir, self.OUTPUT_JSON_FILE)
+
 		# Save text output
-		with open(self.output_text_file, 'w', encoding='utf-8') as f:
+		with open(output_text_file, 'w', encoding='utf-8') as f:
 			f.write(result["text"])
-		print(f"Text transcription saved as {self.output_text_file}")
+		print(f"Text transcription saved as {output_text_file}")
 		
 		# Save JSON output
-		with open(self.output_json_file, 'w', encoding='utf-8') as f:
+		with open(output_json_file, 'w', encoding='utf-8') as f:
 			json.dump(result, f, indent=4, ensure_ascii=False)
-		print(f"JSON transcription saved as {self.output_json_file}")
+		print(f"JSON transcription saved as {output_json_file}")
 		
 		return True
 
 	def transcribe(self, args):
 		"""Main transcription method to be implemented by subclasses.
 		
+		Audio is decoded into memory and jobs write nothing outside their output_dir,
+		so several jobs can run side by side as long as they use different output_dir values.
+
 		Args:
 			args: Arguments containing input file and options
 			
 		Returns:
 			Dictionary with transcription results
 		"""
-		self.reset()
-		input_file = args.get('input') if isinstance(args, dict) else getattr(args, 'input', None)
+		return self.run_job(self.prepare_job(args))
+
+	def prepare_job(self, args):
+		"""Validate, look up the cache and decode the input of one job.
+
+		Does not touch the model, so it can run on another thread while the
+		previous job is being transcribed.
+
+		Returns:
+			Job dictionary for run_job
+		"""
+		input_file = self._get_arg(args, 'input')
+		formats = parse_formats(self._get_arg(args, 'formats'))
+		stream = bool(self._get_arg(args, 'stream', False))
+		if stream and not formats:
+			formats = ["jsonl"]
+
+		# Per-job transcription options understood by the engines; None means engine default
+		options = {
+			name: self._get_arg(args, name)
+			for name in ("language", "word_timestamps", "batch_size")
+			if self._get_arg(args, name) is not None
+		}
+
+		job = {
+			"input": input_file,
+			"options": options,
+			"output_dir": self._get_arg(args, 'output_dir', self.output_dir),
+			"formats": formats,
+			"stream": stream,
+			"cache_key": None,
+			"cached_result": None,
+			"audio": None
+		}
 
 		self.validate_input_file(input_file)
 
+		if TranscriptionCache.is_enabled(self._get_arg(args, 'no_cache', False)):
+			with instrument.stage("hash", bytes=os.path.getsize(input_file)):
+				content_hash = TranscriptionCache.hash_file(input_file)
+			job["cache_key"] = self.cache.make_key(
+				content_hash,
+				self.type,
+				getattr(self, 'model_name', None),
+				{**self.cache_options(), **options}
+			)
+			with instrument.stage("cache_get") as fields:
+				job["cached_result"] = self.cache.get(job["cache_key"])
+				fields["hit"] = job["cached_result"] is not None
+			if job["cached_result"] is not None:
+				print(f"Loaded cached transcription for: {input_file}")
+				return job
+
 		if self._is_video_file(input_file):
 			print(f"Detected video file: {input_file}")
-			audio_file_to_process = self._extract_audio_from_video(input_file)
-			if not audio_file_to_process:
-				return None, None
 
 		elif self._is_audio_file(input_file):
 			print(f"Detected audio file: {input_file}")
-			audio_file_to_process = input_file
 
 		else:
 			raise ValueError("Error: Unsupported file format, Supported formats: .mp4, .avi, .mov, .mkv, .webm, .wav, .flac, .mp3, .m4a, .aac")
 
-		result = self.generate_transcription(audio_file_to_process)
+		job["audio"] = self._decode_audio(input_file)
+		return job
+
+	def run_job(self, job):
+		"""Transcribe a job returned by prepare_job and save its results."""
+		output_dir = job["output_dir"]
+		formats = job["formats"]
+
+		result = job["cached_result"]
+		if result is not None:
+			instrument.progress("cached")
+			if formats:
+				with instrument.stage("write_formats", formats=formats):
+					with SegmentWriter(output_dir, formats) as writer:
+						writer.write_result(result)
+			with instrument.stage("save"):
+				success = self.save_transcription_results(result, output_dir)
+			instrument.flush_counters()
+			return result if success else False
+
+		if self.model is None:
+			instrument.progress("load")
+		self._ensure_model()
+		self.reset()
+		audio = job.pop("audio")
+		audio_seconds = audio.size / self.sample_rate
+		instrument.progress("transcribe", 0.0)
+		if formats:
+			with SegmentWriter(output_dir, formats) as writer:
+				if job["stream"] and self.supports_streaming:
+					# Segments go to disk as they are decoded and are not kept in the result
+					with instrument.stage("generate", engine=self.type, audio_seconds=audio_seconds, streamed=True):
+						result = self.generate_transcription(audio, options=job["options"], writer=writer)
+				else:
+					with instrument.stage("generate", engine=self.type, audio_seconds=audio_seconds):
+						result = self.generate_transcription(audio, options=job["options"])
+					if result:
+						with instrument.stage("write_formats", formats=formats):
+							writer.write_result(result)
+		else:
+			with instrument.stage("generate", engine=self.type, audio_seconds=audio_seconds):
+				result = self.generate_transcription(audio, options=job["options"])
 		
 		if not result:
 			print("Error: No transcription generated")
 			return False
 
-		success = self.save_transcription_results(result)
+		if job["cache_key"] and not result.get("streamed"):
+			with instrument.stage("cache_put"):
+				self.cache.put(job["cache_key"], result)
+
+		instrument.progress("save")
+		with instrument.stage("save"):
+			success = self.save_transcription_results(result, output_dir)
+		instrument.flush_counters(audio_seconds=audio_seconds)
 		
 		return result if success else False
 
-	def generate_transcription(self, input_file):
-		"""Generate transcription - to be implemented by subclasses."""
+	def generate_transcription(self, audio, options=None):
+		"""Generate transcription - to be implemented by subclasses.
+
+		Args:
+			audio: Mono float32 NumPy array sampled at self.sample_rate
+			options: Per-job options such as language and word_timestamps
+		"""
 		raise NotImplementedError("Subclasses must implement generate_transcription method")
 
 	def cleanup(self):
@@ -165,10 +283,10 @@ class BaseSTT:
 		if hasattr(self, 'model') and self.model is not None:
 			print("Cleaning up model...")
 			try:
-				del self.model
+				self.model = None
 				gc.collect()
 				try:
-					if self.device == "cuda":
+					if self._device == "cuda":
 						import torch
 						torch.cuda.empty_cache()
 						torch.cuda.ipc_collect()
@@ -0,0 +1,267 @@
+"""Real-time factor benchmark across the registered engines.
+
+Every engine runs in its own child process over the same corpus: generated
+clips of the given lengths plus test.wav when running from a source checkout.
+The JSON report has, per engine and clip, the real-time factor, time to first
+segment, wall time per stage (decode, load, transcribe, save) and the engine's
+instrumented stages (see stt.instrument), and per engine the peak RSS and
+throughput in audio-hours per hour.
+
+	stt-bench
+	stt-bench --engines stub,fasterwhispher --durations 30,600 --repeat 3 --output bench.json
+
+The "stub" engine has no model weights, so it measures the decode, split, merge
+and save overhead on machines without a model.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from . import instrument
+
+DEFAULT_DURATIONS = "10,60,300,900"
+DEFAULT_CORPUS_DIR = os.path.join(os.path.expanduser("~"), ".cache", "stt-runner", "bench")
+SAMPLE_RATE = 16000
+
+def generate_clip(path, seconds, sample_rate=SAMPLE_RATE):
+	"""Write a speech-like test signal: voiced bursts of harmonics separated by pauses."""
+	import numpy as np
+	rng = np.random.default_rng(int(seconds))
+	audio = np.zeros(int(seconds * sample_rate), dtype=np.float32)
+
+	position = 0
+	while position < len(audio):
+		burst = int(rng.uniform(0.2, 2.5) * sample_rate)
+		pause = int(rng.uniform(0.1, 0.8) * sample_rate)
+		length = min(burst, len(audio) - position)
+		t = np.arange(length, dtype=np.float32) / sample_rate
+		pitch = rng.uniform(100, 250)
+		voiced = sum(np.sin(2 * np.pi * pitch * harmonic * t) / harmonic for harmonic in range(1, 5))
+		envelope = np.sin(np.pi * np.arange(length) / max(1, length))
+		audio[position:position + length] = 0.25 * voiced * envelope
+		position += burst + pause
+
+	audio += rng.normal(0, 0.003, len(audio)).astype(np.float32)
+	pcm = (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+	with wave.open(path, "wb") as f:
+		f.setnchannels(1)
+		f.setsampwidth(2)
+		f.setframerate(sample_rate)
+		f.writeframes(pcm.tobytes())
+
+def build_corpus(corpus_dir, durations, clips=()):
+	"""Paths of the benchmark clips, generating the missing synthetic ones."""
+	os.makedirs(corpus_dir, exist_ok=True)
+	corpus = []
+	for seconds in durations:
+		path = os.path.join(corpus_dir, f"synthetic_{seconds}s.wav")
+		if not os.path.exists(path):
+			print(f"Generating {seconds}s clip: {path}", file=sys.stderr)
+			generate_clip(path, seconds)
+		corpus.append(path)
+
+	test_wav = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.wav")
+	if os.path.exists(test_wav):
+		corpus.append(test_wav)
+	corpus.extend(os.path.abspath(clip) for clip in clips)
+	return corpus
+
+class FirstSegmentWriter:
+	"""Writer stand-in that only records when the first segment arrives."""
+
+	def __init__(self):
+		self.started = time.perf_counter()
+		self.first_segment = None
+		self.segments = 0
+
+	def write(self, segment, words=()):
+		if self.first_segment is None:
+			self.first_segment = time.perf_counter() - self.started
+		self.segments += 1
+
+def run_clip(engine, path, output_dir):
+	"""Run one clip through the stages of BaseSTT.run_job, timing each one.
+
+	The engine's own instrumentation events (split, inference, merge, ...) are
+	collected too and summed per stage under "events".
+	"""
+	events = []
+	instrument.add_sink(events.append)
+	try:
+		result = _run_clip(engine, path, output_dir)
+	finally:
+		instrument.remove_sink(events.append)
+
+	event_stages = {}
+	for event in events:
+		if event["event"] == "stage":
+			event_stages[event["stage"]] = event_stages.get(event["stage"], 0) + event["seconds"]
+	result["events"] = event_stages
+	return result
+
+def _run_clip(engine, path, output_dir):
+	stages = {}
+	started = time.perf_counter()
+	job = engine.prepare_job({"input": path, "no_cache": True, "output_dir": output_dir})
+	stages["decode"] = time.perf_counter() - started
+	audio = job.pop("audio")
+	audio_seconds = audio.size / engine.sample_rate
+
+	stage_started = time.perf_counter()
+	engine._ensure_model()
+	stages["load"] = time.perf_counter() - stage_started
+
+	writer = FirstSegmentWriter()
+	if engine.supports_streaming:
+		result = engine.generate_transcription(audio, options=job["options"], writer=writer)
+	else:
+		result = engine.generate_transcription(audio, options=job["options"])
+	stages["transcribe"] = time.perf_counter() - writer.started
+	if not result:
+		raise RuntimeError(f"No transcription generated for {path}")
+
+	stage_started = time.perf_counter()
+	engine.save_transcription_results(result, output_dir)
+	stages["save"] = time.perf_counter() - stage_started
+
+	processing = time.perf_counter() - started - stages["load"]
+	return {
+		"audio_seconds": audio_seconds,
+		"processing_seconds": processing,
+		"rtf": processing / audio_seconds if audio_seconds else None,
+		# Engines that can't stream hand over every segment at the end
+		"time_to_first_segment": writer.first_segment if writer.first_segment is not None else stages["transcribe"],
+		"streamed": bool(engine.supports_streaming),
+		"stages": stages
+	}
+
+def _median_run(runs):
+	def median(values):
+		return round(statistics.median(values), 4)
+
+	return {
+		"audio_seconds": round(runs[0]["audio_seconds"], 3),
+		"processing_seconds": median([run["processing_seconds"] for run in runs]),
+		"rtf": median([run["rtf"] for run in runs]) if runs[0]["rtf"] is not None else None,
+		"time_to_first_segment": median([run["time_to_first_segment"] for run in runs]),
+		"streamed": runs[0]["streamed"],
+		# Model loading only happens in the first run of the first clip
+		"stages": {
+			name: median([run["stages"][name] for run in runs]) if name != "load" else round(runs[0]["stages"]["load"], 4)
+			for name in runs[0]["stages"]
+		},
+		"events": {
+			name: median([run["events"][name] for run in runs if name in run["events"]])
+			for name in dict.fromkeys(name for run in runs for name in run["events"])
+		}
+	}
+
+def _peak_rss_bytes():
+	import resource
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Kilobytes on Linux, bytes on macOS
+	return peak if sys.platform == "darwin" else peak * 1024
+
+def run_engine(engine_name, clips, repeat=1, model_name=None, device=None):
+	"""Benchmark one engine in this process; engine log output goes to stderr."""
+	from .registry import get_engine_class
+
+	stdout = sys.stdout
+	sys.stdout = sys.stderr
+	output_dir = tempfile.mkdtemp(prefix=f"stt_bench_{engine_name}_")
+	try:
+		engine = get_engine_class(engine_name)(model_name=model_name, device=device)
+		clip_results = []
+		for path in clips:
+			runs = [run_clip(engine, path, output_dir) for _ in range(repeat)]
+			clip_results.append({"clip": path, **_median_run(runs)})
+	finally:
+		shutil.rmtree(output_dir, ignore_errors=True)
+		sys.stdout = stdout
+
+	audio_seconds = sum(clip["audio_seconds"] for clip in clip_results)
+	processing_seconds = sum(clip["processing_seconds"] for clip in clip_results)
+	return {
+		"engine": engine_name,
+		"model": getattr(engine, "model_name", None),
+		"device": engine.device,
+		"ok": True,
+		"load_seconds": clip_results[0]["stages"]["load"] if clip_results else None,
+		"peak_rss_bytes": _peak_rss_bytes(),
+		"audio_seconds": round(audio_seconds, 3),
+		"processing_seconds": round(processing_seconds, 4),
+		"rtf": round(processing_seconds / audio_seconds, 4) if audio_seconds else None,
+		# Audio-hours transcribed per wall-clock hour, model loading excluded
+		"throughput": round(audio_seconds / processing_seconds, 2) if processing_seconds else None,
+		"clips": clip_results
+	}
+
+def run_engine_process(engine_name, clips, args):
+	"""Run one engine in a child process, so peak RSS and imports are its own."""
+	command = [sys.executable, "-m", "stt.bench", "--worker", engine_name, "--repeat", str(args.repeat), "--clips", *clips]
+	if args.model_name:
+		command += ["--model-name", args.model_name]
+	if args.device:
+		command += ["--device", args.device]
+
+	print(f"Benchmarking {engine_name}...", file=sys.stderr)
+	proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=None if args.verbose else subprocess.PIPE, text=True)
+	if proc.returncode == 0:
+		return json.loads(proc.stdout)
+	return {
+		"engine": engine_name,
+		"ok": False,
+		"error": (proc.stderr or "").strip()[-2000:] or f"exited with code {proc.returncode}"
+	}
+
+def main(argv=None):
+	from .registry import available_engines
+
+	parser = argparse.ArgumentParser(description="Benchmark real-time factor, latency and memory of the stt engines")
+	parser.add_argument("--engines", help=f"Comma separated engines (default: all of {', '.join(sorted(available_engines()))})")
+	parser.add_argument("--durations", default=DEFAULT_DURATIONS, help="Lengths in seconds of the generated clips, comma separated")
+	parser.add_argument("--clips", nargs="*", default=[], help="Extra audio/video files to include")
+	parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="Where generated clips are kept")
+	parser.add_argument("--repeat", type=int, default=1, help="Runs per clip, the median is reported")
+	parser.add_argument("--model-name", help="Model to load in every engine (default: each engine's default)")
+	parser.add_argument("--device", help="cuda or cpu (default: detect)")
+	parser.add_argument("--output", help="Also write the JSON report to this file")
+	parser.add_argument("--verbose", action="store_true", help="Show engine log output")
+	parser.add_argument("--worker", help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	if args.worker:
+		report = run_engine(args.worker, args.clips, args.repeat, args.model_name, args.device)
+		print(json.dumps(report))
+		return 0
+
+	durations = [int(value) for value in args.durations.split(",") if value.strip()]
+	corpus = build_corpus(args.corpus_dir, durations, args.clips)
+	engines = [name.strip() for name in args.engines.split(",")] if args.engines else sorted(available_engines())
+
+	report = {
+		"host": socket.gethostname(),
+		"platform": platform.platform(),
+		"python": platform.python_version(),
+		"cpus": os.cpu_count(),
+		"started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"corpus": corpus,
+		"engines": [run_engine_process(name, corpus, args) for name in engines]
+	}
+	output = json.dumps(report, indent=2)
+	print(output)
+	if args.output:
+		with open(args.output, "w", encoding="utf-8") as f:
+			f.write(output + "\n")
+	return 0 if all(engine["ok"] for engine in report["engines"]) else 1
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,100 @@
+import os
+import json
+import hashlib
+import tempfile
+
+class TranscriptionCache:
+	"""Content-addressed on-disk cache of transcription results.
+
+	Entries are keyed by a hash of the input file bytes plus the engine, model
+	and the options that affect the output. The cache is bounded by total size
+	and evicts least recently used entries; a hit refreshes the entry's mtime.
+	"""
+
+	def __init__(self, cache_dir=None, max_bytes=None):
+		self.cache_dir = cache_dir or os.getenv("STT_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "stt-runner", "results")
+		if max_bytes is None:
+			max_bytes = os.getenv("STT_CACHE_MAX_BYTES", 2 * 1024 ** 3)
+		self.max_bytes = int(max_bytes)
+
+	@staticmethod
+	def is_enabled(no_cache=False):
+		if no_cache:
+			return False
+		return os.getenv("STT_CACHE", "1").lower() not in ("0", "false", "no", "off")
+
+	@staticmethod
+	def hash_file(file_path, block_size=1024 * 1024):
+		sha = hashlib.sha256()
+		with open(file_path, 'rb') as f:
+			for block in iter(lambda: f.read(block_size), b''):
+				sha.update(block)
+		return sha.hexdigest()
+
+	def make_key(self, content_hash, engine, model_name, options=None):
+		payload = json.dumps({
+			"content": content_hash,
+			"engine": engine,
+			"model": model_name,
+			"options": options or {}
+		}, sort_keys=True)
+		return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+	def _path(self, key):
+		return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+	def get(self, key):
+		path = self._path(key)
+		try:
+			with open(path, 'r', encoding='utf-8') as f:
+				result = json.load(f)
+		except (OSError, ValueError):
+			return None
+		try:
+			os.utime(path)
+		except OSError:
+			pass
+		return result
+
+	def put(self, key, result):
+		path = self._path(key)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		# Write to a temp file first so readers never see a partial entry
+		fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+		try:
+			with os.fdopen(fd, 'w', encoding='utf-8') as f:
+				json.dump(result, f, ensure_ascii=False)
+			os.replace(temp_path, path)
+		except Exception:
+			if os.path.exists(temp_path):
+				os.remove(temp_path)
+			raise
+		self._evict()
+
+	def _evict(self):
+		entries = []
+		total = 0
+		for root, _, files in os.walk(self.cache_dir):
+			for name in files:
+				if not name.endswith(".json"):
+					continue
+				path = os.path.join(root, name)
+				try:
+					stat = os.stat(path)
+				except OSError:
+					continue
+				entries.append((stat.st_mtime, stat.st_size, path))
+				total += stat.st_size
+
+		if total <= self.max_bytes:
+			return
+
+		entries.sort()
+		for _, size, path in entries:
+			if total <= self.max_bytes:
+				break
+			try:
+				os.remove(path)
+				total -= size
+			except OSError:
+				pass
@@ -7,8 +7,9 @@ import hashlib
 import random
 import time
 import re
-import psutil
 import subprocess
+from functools import lru_cache
+from .resources import get_plan, decode_command_prefix
 
 def get_files_count(directory_path):
     return len(os.listdir(directory_path))
@@ -137,7 +138,9 @@ def is_gpu_available(verbose=True):
             return False
         raise  # re-raise if it's some other unexpected error
 
+@lru_cache(maxsize=None)
 def get_device(is_vision=False):
+    """Pick cuda or cpu. Probed once per process, the CUDA check allocates on the GPU."""
     import torch
     device = None
     if not is_vision and os.getenv("USE_CPU_IF_POSSIBLE", None):
@@ -150,17 +153,58 @@ def get_device(is_vision=False):
 
     return device
 
+def get_memory_usage(device=None):
+    """Bytes used by this process: RSS, plus allocated CUDA memory on a GPU device."""
+    used = 0
+    try:
+        import psutil
+        used += psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    if device == "cuda":
+        import torch
+        used += torch.cuda.memory_allocated()
+    return used
+
 def get_threads():
+    import psutil
     return len(psutil.Process().cpu_affinity())
 
-def run_ffmpeg(cmd):
-    threads = get_threads()
-    cmd = [
-        "taskset", "-c", "2,3",
-        "nice", "-n", "15",
+def run_ffmpeg(cmd, text=True):
+    # ffmpeg gets the decode partition only, see stt.resources
+    prefix = decode_command_prefix() if shutil.which("taskset") else ["nice", "-n", "15"]
+    cmd = prefix + [
         "ffmpeg",
         "-nostdin",
-        "-threads", str(threads)
+        "-threads", str(get_plan().decode_threads)
     ] + cmd[1:]
     print(f"Running command: {' '.join(cmd)}")
-    return subprocess.run(cmd, capture_output=True, text=True, check=True)
\ No newline at end of file
+    return subprocess.run(cmd, capture_output=True, text=text, check=True)
+
+def decode_audio(file_path, sample_rate=16000):
+    """
+    Decode the first audio stream of any audio/video file in a single ffmpeg run.
+
+    The audio is resampled to mono `sample_rate` PCM and read straight from
+    ffmpeg's stdout, so nothing is written to disk.
+
+    Returns:
+        float32 NumPy array with samples in [-1, 1]
+    """
+    import numpy as np
+    cmd = [
+        'ffmpeg',
+        '-v', 'error',
+        '-i', file_path,
+        '-map', '0:a:0',
+        '-vn',
+        '-f', 's16le',
+        '-acodec', 'pcm_s16le',
+        '-ac', '1',
+        '-ar', str(sample_rate),
+        'pipe:1'
+    ]
+    result = run_ffmpeg(cmd, text=False)
+    audio = np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32)
+    audio /= 32768.0
+    return audio
\ No newline at end of file
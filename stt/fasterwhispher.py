@@ -1,60 +1,139 @@
-import torch
+import os
+import time
 from .base import BaseSTT
+from . import instrument, resources
 
 class FasterWhispherSTTProcessor(BaseSTT):
 	"""Speech-to-text processor using OpenAI Whisper."""
+
+	supports_streaming = True
+	default_model_name = "base"
 	
-	def __init__(self, model_name = "base", device=None):
+	def __init__(self, model_name=None, device=None, compute_type=None):
 		super().__init__("fasterwhispher")
-		self.model_name = model_name
-		self._load_model()
+		self.model_name = model_name or self.default_model_name
+		# Left unset, these come from the host's auto-tune profile (see stt.autotune)
+		self.compute_type = compute_type
+		self.cpu_threads = int(os.getenv("STT_FW_CPU_THREADS", 0))
+		# batch_size > 0 decodes VAD segments in parallel batches through
+		# faster-whisper's BatchedInferencePipeline; 0 keeps the sequential decoder.
+		self.batch_size = int(os.getenv("STT_FW_BATCH_SIZE", 0))
+		# Independent model workers, so several batches/jobs can run at once
+		self.num_workers = int(os.getenv("STT_FW_NUM_WORKERS", 0))
+		self.pipeline = None
+		# As requested, not resolved: the cache key must not need torch to pick a device
+		self.requested_device = device or "auto"
+		if device:
+			self.device = device
 
 	def _load_model(self):
 		"""Load OpenAI Whisper model."""
 		print(f"Initializing Faster Whisper...")
 		from faster_whisper import WhisperModel
+		from . import autotune
+		compute_type, cpu_threads, num_workers = self.compute_type, self.cpu_threads, self.num_workers
+		if not (compute_type and cpu_threads and num_workers):
+			profile = autotune.get_profile(self.model_name, self.device, tune=autotune.is_enabled())
+			if profile:
+				print(f"Using auto-tune profile: {profile['compute_type']}, {profile['cpu_threads']} threads, {profile['num_workers']} workers")
+				compute_type = compute_type or profile["compute_type"]
+				cpu_threads = cpu_threads or profile["cpu_threads"]
+				num_workers = num_workers or profile["num_workers"]
+		if not self.cpu_threads:
+			# Stay within this process's inference partition (see stt.resources)
+			plan = resources.get_plan()
+			cpu_threads = min(cpu_threads or plan.inference_threads, plan.inference_threads)
+			num_workers = max(1, min(num_workers or 1, plan.inference_threads // cpu_threads))
 		print(f"Loading model: {self.model_name}")
-		self.model = WhisperModel(self.model_name, device=self.device)
+		self.model = WhisperModel(
+			self.model_name,
+			device=self.device,
+			compute_type=compute_type or "default",
+			cpu_threads=cpu_threads,
+			num_workers=num_workers or 1
+		)
+		self.pipeline = None
 		print("Model loaded successfully!")
 
-	def generate_transcription(self, input_file):
-		"""Generate transcription using OpenAI Whisper."""
-		print(f"Transcribing: {input_file}")
+	def _get_pipeline(self):
+		if self.pipeline is None:
+			from faster_whisper import BatchedInferencePipeline
+			self.pipeline = BatchedInferencePipeline(model=self.model)
+		return self.pipeline
+
+	def cache_options(self):
+		# Batched decoding segments the audio with VAD, and precision and device change
+		# the decoded text, so each resident variant (see ModelManager) caches apart
+		return {
+			"batch_size": self.batch_size,
+			"compute_type": self.compute_type or "default",
+			"device": self.requested_device
+		}
+
+	def generate_transcription(self, audio, options=None, writer=None):
+		"""Generate transcription using OpenAI Whisper.
+
+		With a writer, each segment is written out as soon as it is decoded and
+		segments/words are not kept in memory.
+		"""
+		print(f"Transcribing {audio.size / self.sample_rate:.2f}s of audio")
 		
 		# Transcribe with OpenAI Whisper
-		options = {
-			"word_timestamps":True,
+		options = options or {}
+		transcribe_options = {
+			"word_timestamps": options.get("word_timestamps", True),
+			"language": options.get("language"),
 			"log_progress": True
 		}
+		batch_size = options.get("batch_size", self.batch_size)
+		import torch
+		started = time.perf_counter()
 		with torch.inference_mode():
-			segments, info = self.model.transcribe(input_file, **options)
-		full_text = ""
+			if batch_size and batch_size > 0:
+				print(f"Using batched inference (batch size {batch_size})")
+				segments, info = self._get_pipeline().transcribe(audio, batch_size=batch_size, **transcribe_options)
+			else:
+				segments, info = self.model.transcribe(audio, **transcribe_options)
+		text_parts = []
 		segment_array = []
 		word_array = []
 
-		for seg in segments:
-			# Add to full text
-			full_text += seg.text.strip() + " "
-
-			# Add segment-level data
-			segment_array.append({
-				"start": seg.start,
-				"end": seg.end,
-				"text": seg.text.strip()
-			})
+		# Decoding happens lazily while iterating segments, so it is timed here
+		duration = audio.size / self.sample_rate
+		with instrument.stage("inference", audio_seconds=duration, batch_size=batch_size or 0) as fields:
+			for seg in segments:
+				if not text_parts:
+					instrument.emit("first_segment", seconds=round(time.perf_counter() - started, 6))
+				if duration:
+					instrument.progress("transcribe", seg.end / duration)
+				text = seg.text.strip()
+				# Add to full text
+				text_parts.append(text)
 
-			# Add word-level data
-			for w in seg.words:
-				word_array.append({
+				segment = {
+					"start": seg.start,
+					"end": seg.end,
+					"text": text
+				}
+				words = [{
 					"word": w.word.strip(),
 					"start": w.start,
 					"end": w.end,
 					"probability": w.probability
-				})
+				} for w in seg.words or []]
+
+				if writer:
+					writer.write(segment, words)
+				else:
+					# Add segment-level and word-level data
+					segment_array.append(segment)
+					word_array.extend(words)
+			fields["segments"] = len(text_parts)
+		instrument.count("segments", len(text_parts))
 
 		# Final result in your desired format
 		transcription_result = {
-			"text": full_text.strip(),
+			"text": " ".join(text_parts).strip(),
 			"language": info.language,
 			"model": f"{self.type}-{self.model_name}",
 			"duration": info.duration,
@@ -64,6 +143,8 @@ class FasterWhispherSTTProcessor(BaseSTT):
 			},
 			"engine": self.type
 		}
+		if writer:
+			transcription_result["streamed"] = True
 		
 		print(f"Transcription completed successfully!")
-		return transcription_result
\ No newline at end of file
+		return transcription_result
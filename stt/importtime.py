@@ -0,0 +1,86 @@
+"""Startup latency report for the stt package.
+
+Runs `python -X importtime` in a fresh interpreter for each module and reports
+the cumulative import time, the slowest imports and whether any heavy
+dependency (torch, NeMo, ...) was pulled in. Also times `stt-transcribe --help`.
+
+	python -m stt.importtime
+	python -m stt.importtime stt.runner stt.base --top 10 --max-ms 300
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("torch", "numpy", "faster_whisper", "ctranslate2", "whisper", "nemo", "librosa", "psutil", "dotenv")
+
+def parse_importtime(stderr):
+	"""Parse `-X importtime` output into (module, self_us, cumulative_us) rows."""
+	rows = []
+	for line in stderr.splitlines():
+		if not line.startswith("import time:"):
+			continue
+		parts = line[len("import time:"):].split("|")
+		if len(parts) != 3:
+			continue
+		try:
+			self_us, cumulative_us = int(parts[0]), int(parts[1])
+		except ValueError:
+			# Header line
+			continue
+		rows.append((parts[2].strip(), self_us, cumulative_us))
+	return rows
+
+def measure_import(module, top=10, python=sys.executable):
+	started = time.perf_counter()
+	proc = subprocess.run(
+		[python, "-X", "importtime", "-c", f"import {module}"],
+		capture_output=True, text=True
+	)
+	wall = time.perf_counter() - started
+	if proc.returncode != 0:
+		raise RuntimeError(f"Importing {module} failed:\n{proc.stderr.strip()[-2000:]}")
+
+	rows = parse_importtime(proc.stderr)
+	loaded = {name for name, _, _ in rows}
+	cumulative = next((cum for name, _, cum in rows if name == module), 0)
+	slowest = sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+	return {
+		"module": module,
+		"import_ms": round(cumulative / 1000, 2),
+		"process_wall_ms": round(wall * 1000, 2),
+		"modules_loaded": len(rows),
+		"heavy_modules_loaded": [name for name in HEAVY_MODULES if name in loaded],
+		"slowest_self_ms": [{"module": name, "self_ms": round(self_us / 1000, 2)} for name, self_us, _ in slowest]
+	}
+
+def measure_help(python=sys.executable):
+	started = time.perf_counter()
+	proc = subprocess.run([python, "-m", "stt.runner", "--help"], capture_output=True, text=True)
+	return {
+		"command": "stt-transcribe --help",
+		"wall_ms": round((time.perf_counter() - started) * 1000, 2),
+		"ok": proc.returncode == 0
+	}
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Report import/startup latency of the stt package")
+	parser.add_argument("modules", nargs="*", default=["stt.runner", "stt.base"], help="Modules to import")
+	parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list")
+	parser.add_argument("--max-ms", type=float, help="Exit with 1 if any module takes longer than this to import")
+	args = parser.parse_args(argv)
+
+	report = {
+		"python": sys.version.split()[0],
+		"imports": [measure_import(module, args.top) for module in args.modules],
+		"help": measure_help()
+	}
+	print(json.dumps(report, indent=2))
+
+	if args.max_ms is not None and any(entry["import_ms"] > args.max_ms for entry in report["imports"]):
+		return 1
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,148 @@
+"""Stage timers, counters and structured events.
+
+Every event is a dict such as
+
+	{"event": "stage", "stage": "decode", "seconds": 0.412, "audio_seconds": 600.0,
+	 "bytes": 9600000, "job": "job-1", "ts": 1760000000.0}
+
+and is handed to every registered sink. With no sink registered, stage() hands
+out a shared no-op context manager and count()/emit() return straight away, so
+instrumented code costs a function call per stage.
+
+STT_EVENTS turns on a JSON Lines sink, at import time and again by
+configure_from_env() once .env is loaded: "1" or "stderr" writes to stderr, any
+other value except "0" is a file path to append to.
+
+	with instrument.stage("decode", bytes=size) as fields:
+		audio = decode(path)
+		fields["audio_seconds"] = len(audio) / 16000
+	instrument.count("segments")
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+_sinks = []
+_counters = Counter()
+_counters_lock = threading.Lock()
+# Fields added to every event, e.g. the id of the job being processed
+_bound = contextvars.ContextVar("stt_instrument_bound", default={})
+
+def enabled():
+	return bool(_sinks)
+
+def add_sink(sink):
+	"""Register a callable that receives every event dict."""
+	_sinks.append(sink)
+
+def remove_sink(sink):
+	if sink in _sinks:
+		_sinks.remove(sink)
+
+def emit(event, **fields):
+	if not _sinks:
+		return
+	record = {"event": event, **_bound.get(), **fields, "ts": round(time.time(), 6)}
+	for sink in list(_sinks):
+		sink(record)
+
+@contextmanager
+def bind(**fields):
+	"""Add fields to every event emitted in this context (and thread)."""
+	token = _bound.set({**_bound.get(), **fields})
+	try:
+		yield
+	finally:
+		_bound.reset(token)
+
+class _Stage:
+	__slots__ = ("name", "fields", "started")
+
+	def __init__(self, name, fields):
+		self.name = name
+		self.fields = fields
+
+	def __enter__(self):
+		self.started = time.perf_counter()
+		return self.fields
+
+	def __exit__(self, exc_type, exc, tb):
+		seconds = time.perf_counter() - self.started
+		if exc_type is not None:
+			self.fields["error"] = exc_type.__name__
+		emit("stage", stage=self.name, seconds=round(seconds, 6), **self.fields)
+		return False
+
+class _NullStage:
+	__slots__ = ()
+
+	def __enter__(self):
+		# Fresh dict so callers can always record fields, even when nothing listens
+		return {}
+
+	def __exit__(self, exc_type, exc, tb):
+		return False
+
+_NULL_STAGE = _NullStage()
+
+def stage(name, **fields):
+	"""Context manager timing one stage; yields a dict of extra fields for the event."""
+	if not _sinks:
+		return _NULL_STAGE
+	return _Stage(name, fields)
+
+def progress(stage, fraction=None, **fields):
+	"""Report that a job entered `stage`, or got `fraction` (0..1) of the way through it."""
+	if not _sinks:
+		return
+	if fraction is not None:
+		fields["fraction"] = round(min(1.0, max(0.0, fraction)), 4)
+	emit("progress", stage=stage, **fields)
+
+def count(name, value=1):
+	if not _sinks:
+		return
+	with _counters_lock:
+		_counters[name] += value
+
+def flush_counters(**fields):
+	"""Emit the counters gathered since the last flush as one event and reset them."""
+	if not _sinks:
+		return
+	with _counters_lock:
+		counters = dict(_counters)
+		_counters.clear()
+	if counters:
+		emit("counters", counters=counters, **fields)
+
+class JSONLinesSink:
+	"""Writes events as JSON lines to a stream, or appends them to a file."""
+
+	def __init__(self, target):
+		if target in ("1", "true", "stderr"):
+			self.stream = sys.stderr
+		else:
+			self.stream = open(target, "a", encoding="utf-8")
+		self._lock = threading.Lock()
+
+	def __call__(self, record):
+		line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+		with self._lock:
+			self.stream.write(line)
+			self.stream.flush()
+
+_env_sink = None
+
+def configure_from_env():
+	"""Add the STT_EVENTS sink if it is set and not added yet."""
+	global _env_sink
+	if _env_sink is None and os.getenv("STT_EVENTS", "0").lower() not in ("", "0", "false", "no", "off"):
+		_env_sink = JSONLinesSink(os.getenv("STT_EVENTS"))
+		add_sink(_env_sink)
+
+configure_from_env()
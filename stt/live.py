@@ -17,8 +17,17 @@ class LiveSTTProcessor(BaseSTT):
 
     def _load_model(self):
         from faster_whisper import WhisperModel
-        compute = "int8" if self.device == "cpu" else "float16"
-        self.model = WhisperModel(self.model_name, device=self.device, compute_type=compute)
+        from .autotune import load_profile
+        profile = load_profile(self.model_name, self.device) or {
+            "compute_type": "int8" if self.device == "cpu" else "float16",
+            "cpu_threads": 0,
+        }
+        self.model = WhisperModel(
+            self.model_name,
+            device=self.device,
+            compute_type=profile["compute_type"],
+            cpu_threads=profile["cpu_threads"],
+        )
 
     def _audio_callback(self, indata, frames, time_info, status):
         if status:
@@ -95,5 +104,5 @@ class LiveSTTProcessor(BaseSTT):
     def stop(self):
         self.is_running = False
 
-    def generate_transcription(self, input_file):
+    def generate_transcription(self, audio, options=None):
         raise NotImplementedError("LiveSTT does not support file transcription. Use start() for live mic input.")
@@ -0,0 +1,91 @@
+import os
+import threading
+from collections import OrderedDict
+from .registry import canonical_name, get_engine_class
+
+class ModelManager:
+	"""Keeps engines resident in one process, keyed by (engine, model_name, device, compute_type).
+
+	Engine objects are cheap and are kept for the life of the process; their models
+	are what cost memory. Loaded models are tracked in least recently used order,
+	and before a model is loaded, others are unloaded until the expected total fits
+	in the memory budget (STT_MODEL_MEMORY_BUDGET_MB, 0 = unlimited). The expected
+	size of a model is what it took the last time it was loaded in this process.
+	"""
+
+	def __init__(self, memory_budget_mb=None):
+		# None reads STT_MODEL_MEMORY_BUDGET_MB on first use, after the runner has loaded .env
+		self._memory_budget_mb = memory_budget_mb
+		self._memory_budget = None
+		self._engines = OrderedDict()
+		# id(engine) -> key, so run_job never has to search _engines
+		self._keys = {}
+		self._footprints = {}
+		self._lock = threading.Lock()
+
+	@property
+	def memory_budget(self):
+		if self._memory_budget is None:
+			budget_mb = self._memory_budget_mb
+			if budget_mb is None:
+				budget_mb = float(os.getenv("STT_MODEL_MEMORY_BUDGET_MB", 0))
+			self._memory_budget = int(budget_mb * 1024 * 1024)
+		return self._memory_budget
+
+	def get(self, engine_name, model_name=None, device=None, compute_type=None):
+		engine_name = canonical_name(engine_name)
+		engine_class = get_engine_class(engine_name)
+		key = (
+			engine_name,
+			model_name or getattr(engine_class, "default_model_name", None),
+			device or "auto",
+			compute_type or "default"
+		)
+		with self._lock:
+			engine = self._engines.get(key)
+			if engine is None:
+				engine = engine_class(model_name=key[1], device=device, compute_type=compute_type)
+				self._engines[key] = engine
+				self._keys[id(engine)] = key
+			return engine
+
+	def _loaded_bytes(self):
+		return sum(
+			self._footprints.get(key, 0)
+			for key, engine in self._engines.items()
+			if engine.model is not None
+		)
+
+	def _evict(self, keep, needed=0):
+		if not self.memory_budget:
+			return
+		for key, engine in list(self._engines.items()):
+			if self._loaded_bytes() + needed <= self.memory_budget:
+				break
+			if engine is keep or engine.model is None:
+				continue
+			print(f"Unloading {key[0]} model {key[1]} to stay within the memory budget")
+			engine.cleanup()
+
+	def run_job(self, engine, job):
+		"""Run a prepared job, unloading least recently used models around it as needed."""
+		with self._lock:
+			key = self._keys.get(id(engine))
+			if key is not None:
+				self._engines.move_to_end(key)
+				if engine.model is None:
+					self._evict(keep=engine, needed=self._footprints.get(key, 0))
+
+		result = engine.run_job(job)
+
+		with self._lock:
+			if key is not None:
+				self._footprints[key] = getattr(engine, "model_footprint", 0)
+				self._evict(keep=engine)
+		return result
+
+	def unload_all(self):
+		"""Free every loaded model, when the server shuts down."""
+		with self._lock:
+			for engine in self._engines.values():
+				engine.cleanup()
@@ -1,13 +1,17 @@
-import torch
 from .base import BaseSTT
+from . import instrument
 
 class OpenAISTTProcessor(BaseSTT):
 	"""Speech-to-text processor using OpenAI Whisper."""
+
+	default_model_name = "large-v3-turbo"
 	
-	def __init__(self):
+	def __init__(self, model_name=None, device=None, compute_type=None):
+		"""compute_type is accepted for a uniform engine signature; Whisper picks its own precision."""
 		super().__init__("openai")
-		self.model_name = "large-v3-turbo"
-		self._load_model()
+		self.model_name = model_name or self.default_model_name
+		if device:
+			self.device = device
 
 	def _load_model(self):
 		"""Load OpenAI Whisper model."""
@@ -17,23 +21,28 @@ class OpenAISTTProcessor(BaseSTT):
 		self.model = whisper.load_model(self.model_name, device=self.device)
 		print("Model loaded successfully!")
 
-	def generate_transcription(self, input_file):
+	def generate_transcription(self, audio, options=None):
 		"""Generate transcription using OpenAI Whisper."""
-		print(f"Transcribing: {input_file}")
+		print(f"Transcribing {audio.size / self.sample_rate:.2f}s of audio")
 		
 		# Transcribe with OpenAI Whisper
-		options = {
-			# "word_timestamps":True,
+		options = options or {}
+		transcribe_options = {
+			"word_timestamps": options.get("word_timestamps", False),
+			"language": options.get("language"),
 			"verbose": True
 		}
 		
-		result = self.model.transcribe(input_file, **options)
+		with instrument.stage("inference", audio_seconds=audio.size / self.sample_rate) as fields:
+			result = self.model.transcribe(audio, **transcribe_options)
+			fields["segments"] = len(result.get("segments", []))
+		instrument.count("segments", len(result.get("segments", [])))
 		
 		transcription_result = {
 			"text": result["text"],
 			"language": result["language"],
 			"model": f"{self.type}-{self.model_name}",
-			"duration": result.get("duration", 0),
+			"duration": result.get("duration", audio.size / self.sample_rate),
 			"segments": result.get("segments", []),
 			"engine": self.type
 		}
@@ -1,24 +1,41 @@
 import re
-from typing import Optional, Dict, Any, List
+import bisect
+from typing import Optional, Dict, Any, List, Tuple
 
-import torch
+import numpy as np
 import os
-import librosa
-import soundfile as sf
-import ffmpeg
 from .base import BaseSTT
+from . import instrument
 
 class ParakeetSTTProcessor(BaseSTT):
 	"""Enhanced Speech-to-Text converter with smart overlap handling."""
+
+	default_model_name = "nvidia/parakeet-tdt-0.6b-v3"
 	
-	def __init__(self):
+	def __init__(self, model_name=None, device=None, compute_type=None):
+		"""compute_type is accepted for a uniform engine signature; FP16 is used on GPU."""
 		super().__init__("parakeet")
-		self.model_name = "nvidia/parakeet-tdt-0.6b-v3"
+		self.model_name = model_name or self.default_model_name
+		if device:
+			self.device = device
 		self.chunk_duration = 300
 		self.chunk_overlap = 5
-		self.sample_rate = 16000
-		self.model_path = "./models/nemo_asr.nemo"
-		self._load_model()
+		# "fixed" cuts every chunk_duration seconds with chunk_overlap seconds of overlap.
+		# "silence" cuts at the quietest point in the last silence_search seconds before
+		# each chunk_duration boundary, so chunks need little or no overlap.
+		self.split_mode = os.getenv("STT_PARAKEET_SPLIT_MODE", "fixed")
+		self.silence_search = 30
+		self.silence_frame = 0.05
+		self.silence_min_duration = 0.3
+		self.silence_overlap = float(os.getenv("STT_PARAKEET_SILENCE_OVERLAP", 0))
+		# Chunks per NeMo forward pass, and chunks submitted per transcribe() call (0 = all at once).
+		# Progress is reported after each window, so by default a window is one batch.
+		self.batch_size = int(os.getenv("STT_PARAKEET_BATCH_SIZE", 4))
+		self.batch_window = int(os.getenv("STT_PARAKEET_BATCH_WINDOW", max(1, self.batch_size)))
+		if self.model_name == self.default_model_name:
+			self.model_path = "./models/nemo_asr.nemo"
+		else:
+			self.model_path = f"./models/{self.model_name.replace('/', '_')}.nemo"
 
 	def _load_model(self):
 		print("Initializing Nemo ASR...")
@@ -38,84 +55,128 @@ class ParakeetSTTProcessor(BaseSTT):
 				model_name=self.model_name,
         		map_location=self.device
 			)
-			self.model.save_to("./models/nemo_asr.nemo")
+			self.model.save_to(self.model_path)
 
 		# FP16 only on GPU
 		if self.device.startswith("cuda"):
 			self.model = self.model.half()
 		print("Model loaded successfully!")
 
-	def get_media_metadata(self, file_path):
-		probe = ffmpeg.probe(file_path, v='error', select_streams='v:0', show_entries='format=duration,streams')
-		duration_in_sec_float = float(probe['format']['duration'])
-		duration_in_sec_int = int(duration_in_sec_float)
-		size = int(os.path.getsize(file_path) // (1024 * 1024))
-		fps = None
-		for stream in probe['streams']:
-			if stream['codec_type'] == 'video':
-				fps = eval(stream['r_frame_rate'])
-		return duration_in_sec_int, duration_in_sec_float, size, fps
-
-	def _get_audio_duration(self, audio_file: str) -> float:
-		duration, _, _, _ = self.get_media_metadata(audio_file)
-		return duration
-	
-	def _split_audio_file(self, audio_file: str) -> List[str]:
-		audio, sr = librosa.load(audio_file, sr=self.sample_rate)
+	def cache_options(self):
+		return {
+			"chunk_duration": self.chunk_duration,
+			"chunk_overlap": self.chunk_overlap,
+			"split_mode": self.split_mode,
+			"silence_overlap": self.silence_overlap,
+		}
+
+	def _find_quiet_point(self, audio: np.ndarray, lo: int, hi: int) -> int:
+		"""Return the sample index at the centre of the quietest stretch of audio[lo:hi]."""
+		frame = max(1, int(self.silence_frame * self.sample_rate))
+		n_frames = (hi - lo) // frame
+		if n_frames == 0:
+			return hi
+
+		region = audio[lo:lo + n_frames * frame].reshape(n_frames, frame)
+		energy = np.square(region).mean(axis=1)
+
+		# Average over silence_min_duration so a pause wins over a single quiet frame
+		window = min(n_frames, max(1, int(self.silence_min_duration / self.silence_frame)))
+		smoothed = np.convolve(energy, np.ones(window) / window, mode='valid')
+		quietest = int(np.argmin(smoothed))
+		return lo + int((quietest + window / 2) * frame)
+
+	def _split_audio(self, audio: np.ndarray) -> Tuple[List[np.ndarray], List[float]]:
+		"""Split audio into overlapping chunks; the chunks are views, nothing is copied.
+
+		Returns the chunks and the start time of each chunk in seconds.
+		"""
+		if self.split_mode not in ("fixed", "silence"):
+			raise ValueError(f"Unknown split mode: {self.split_mode}, expected 'fixed' or 'silence'")
+
+		sr = self.sample_rate
 		total_duration = len(audio) / sr
+		on_silence = self.split_mode == "silence"
 		
 		print(f"Audio duration: {total_duration:.2f} seconds")
-		print(f"Splitting into {self.chunk_duration}s chunks...")
+		print(f"Splitting into {self.chunk_duration}s chunks ({self.split_mode} boundaries)...")
 		
-		chunk_files = []
+		chunks = []
+		offsets = []
 		chunk_samples = int(self.chunk_duration * sr)
-		overlap_samples = int(self.chunk_overlap * sr)
+		overlap_samples = int((self.silence_overlap if on_silence else self.chunk_overlap) * sr)
+		search_samples = int(self.silence_search * sr)
 
-		chunk_count = 0
 		start_sample = 0
 		
 		while start_sample < len(audio):
 			end_sample = min(start_sample + chunk_samples, len(audio))
-			chunk_audio = audio[start_sample:end_sample]
-			
-			chunk_file = os.path.join(self.temp_dir, f"chunk_{chunk_count:04d}.wav")
-			sf.write(chunk_file, chunk_audio, sr)
-			chunk_files.append(chunk_file)
+			if on_silence and end_sample < len(audio):
+				# Never search so far back that the next chunk would start before this one
+				lo = max(start_sample + overlap_samples + 1, end_sample - search_samples)
+				end_sample = self._find_quiet_point(audio, lo, end_sample)
+			chunks.append(audio[start_sample:end_sample])
+			offsets.append(start_sample / sr)
 			
-			print(f"Created chunk {chunk_count + 1}: {start_sample/sr:.2f}s - {end_sample/sr:.2f}s")
+			print(f"Created chunk {len(chunks)}: {start_sample/sr:.2f}s - {end_sample/sr:.2f}s")
 			
 			start_sample = end_sample - overlap_samples
-			chunk_count += 1
 			
 			if end_sample >= len(audio):
 				break
 		
-		print(f"Created {len(chunk_files)} chunks")
-		return chunk_files
+		print(f"Created {len(chunks)} chunks")
+		return chunks, offsets
 	
-	def _transcribe_single_chunk(self, audio_file: str) -> Optional[Dict[str, Any]]:
+	def _output_to_result(self, output) -> Dict[str, Any]:
+		timestamps = {}
+		if hasattr(output, 'timestamp'):
+			timestamps = {
+				'word': output.timestamp.get('word'),
+				'segment': self.get_segements(output.timestamp.get('segment'))
+			}
+		
+		return {
+			'text': output.text,
+			'timestamps': timestamps
+		}
+
+	def _transcribe_single_chunk(self, audio: np.ndarray) -> Optional[Dict[str, Any]]:
 		outputs = self.model.transcribe(
-			[audio_file],
+			[audio],
 			batch_size=1,
 			timestamps=True
 		)
 		
 		if outputs and len(outputs) > 0:
-			output = outputs[0]
-			
-			timestamps = {}
-			if hasattr(output, 'timestamp'):
-				timestamps = {
-					'word': output.timestamp.get('word'),
-					'segment': self.get_segements(output.timestamp.get('segment'))
-				}
-			
-			return {
-				'text': output.text,
-				'timestamps': timestamps
-			}
+			return self._output_to_result(outputs[0])
 		raise Exception(f"Error transcribing chunk")
 
+	def _transcribe_chunks(self, chunks: List[np.ndarray]) -> List[Dict[str, Any]]:
+		"""Transcribe chunks in windows of batch_window, batch_size chunks per forward pass.
+
+		Results keep the order of the input chunks, each with its own chunk-relative timestamps.
+		"""
+		window = self.batch_window if self.batch_window > 0 else len(chunks)
+		batch_size = max(1, self.batch_size)
+		chunk_results = []
+
+		for start in range(0, len(chunks), window):
+			window_chunks = chunks[start:start + window]
+			print(f"Processing chunk {start + 1}/{len(chunks)} (window of {len(window_chunks)}, batch size {batch_size})")
+			outputs = self.model.transcribe(
+				window_chunks,
+				batch_size=batch_size,
+				timestamps=True
+			)
+			if not outputs or len(outputs) != len(window_chunks):
+				raise Exception(f"Error transcribing chunks {start + 1}-{start + len(window_chunks)}")
+			chunk_results.extend(self._output_to_result(output) for output in outputs)
+			done = start + len(window_chunks)
+			instrument.progress("transcribe", done / len(chunks), chunk=done, chunks=len(chunks))
+
+		return chunk_results
+
 	def _get_seg_timestamp(self, all_word_timestamps):
 		# Parameters
 		max_pause_duration = 1.0  # max allowed pause between words in a segment
@@ -159,52 +220,37 @@ class ParakeetSTTProcessor(BaseSTT):
 		return all_segment_timestamps
 
 
-	def _merge_chunk_results(self, chunk_results: List[Dict[str, Any]]) -> Dict[str, Any]:
-		"""Merge chunk results by finding and removing overlapping words using timestamp matching."""
+	def _merge_chunk_results(self, chunk_results: List[Dict[str, Any]], offsets: List[float]) -> Dict[str, Any]:
+		"""Merge chunk results by finding and removing overlapping words using timestamp matching.
+
+		Words are shifted to absolute time in place and appended to one list that stays
+		sorted by start time, so each overlap is resolved with a binary search and no
+		final sort is needed.
+		"""
 		all_word_timestamps = []
 		
 		# Process each chunk
-		for i, result in enumerate(chunk_results):
+		for i, (result, time_offset) in enumerate(zip(chunk_results, offsets)):
 			timestamps = result.get('timestamps', {})
-			word_timestamps = timestamps.get('word', [])
-			segment_timestamps = timestamps.get('segment', [])
-			
-			# Calculate time offset for this chunk (original audio time)
-			time_offset = i * (self.chunk_duration - self.chunk_overlap)
+			word_timestamps = timestamps.get('word') or []
 			
 			# Adjust current chunk timestamps to absolute time
-			adjusted_curr_words = []
 			for word in word_timestamps:
-				adjusted_word = word.copy()
-				adjusted_word['start'] = word.get('start', 0) + time_offset
-				adjusted_word['end'] = word.get('end', 0) + time_offset
-				adjusted_curr_words.append(adjusted_word)
-			
-			adjusted_curr_segments = []
-			for segment in segment_timestamps:
-				adjusted_segment = segment.copy()
-				adjusted_segment['start'] = segment.get('start', 0) + time_offset
-				adjusted_segment['end'] = segment.get('end', 0) + time_offset
-				adjusted_curr_segments.append(adjusted_segment)
+				word['start'] = word.get('start', 0) + time_offset
+				word['end'] = word.get('end', 0) + time_offset
 			
-			# For first chunk, add everything
-			if i == 0:
-				all_word_timestamps.extend(adjusted_curr_words)
-			else:
-				# For subsequent chunks, find and remove timestamp overlaps
-				remove_word_count = self._find_timestamp_overlap(all_word_timestamps, adjusted_curr_words, i)
+			# For subsequent chunks, find and remove timestamp overlaps
+			if i > 0:
+				remove_word_count = self._find_timestamp_overlap(all_word_timestamps, time_offset)
 				
 				print(f"Chunk {i}: Skipping {remove_word_count} overlapping words based on timestamps from prev word")
 
 				if remove_word_count > 0:
-					# Skip the overlapping words
-					all_word_timestamps = all_word_timestamps[:-remove_word_count]
+					# Drop the previous chunk's words that the current chunk transcribes again
+					del all_word_timestamps[-remove_word_count:]
 
-				# Add remaining timestamps
-				all_word_timestamps.extend(adjusted_curr_words)
-		
-		# Sort all timestamps by start time to ensure proper order
-		all_word_timestamps.sort(key=lambda x: x.get('start', 0))
+			# Add remaining timestamps
+			all_word_timestamps.extend(word_timestamps)
 		
 		# Reconstruct text from word timestamps
 		final_text = ' '.join([word.get('word', '') for word in all_word_timestamps])
@@ -218,38 +264,24 @@ class ParakeetSTTProcessor(BaseSTT):
 			}
 		}
 
-	def _find_timestamp_overlap(self, prev_words: List[Dict], curr_words: List[Dict], index) -> int:
+	def _find_timestamp_overlap(self, prev_words: List[Dict], overlap_start_time: float) -> int:
 		"""
 		Find overlapping words using timestamp matching instead of text matching.
 		
 		Args:
-			prev_words: List of word dictionaries from all previous chunks (with absolute timestamps)
-			curr_words: List of word dictionaries from current chunk (with absolute timestamps)
+			prev_words: List of word dictionaries from all previous chunks (with absolute
+				timestamps), sorted by start time
+			overlap_start_time: Absolute time at which the current chunk starts
 			
 		Returns:
-			Number of words to skip from the beginning of curr_words
+			Number of words to remove from the end of prev_words
 		"""
-		if not prev_words or not curr_words:
+		if not prev_words:
 			return 0
 		
-		# Get the timestamp range we expect overlap to occur in
-		# Overlap should happen in the last chunk_overlap seconds of previous audio
-		if prev_words:
-			overlap_start_time = (self.chunk_duration * index) - (self.chunk_overlap)
-		else:
-			return 0
-		
-		# Find words in previous chunks that fall in the overlap period
-		remove_word_count = 0
-		for i, word in enumerate(prev_words):
-			word_start = word.get('start', 0)
-			word_end = word.get('end', 0)
-			
-			# Include words that overlap with the expected overlap period
-			if word_start > overlap_start_time and word_end > overlap_start_time:
-				remove_word_count += 1
-
-		return remove_word_count
+		# Every previous word starting at or after the current chunk's start is transcribed again by it
+		boundary = bisect.bisect_left(prev_words, overlap_start_time, key=lambda word: word.get('start', 0))
+		return len(prev_words) - boundary
 
 	def get_segements(self, data):
 		final_seg = []
@@ -262,30 +294,39 @@ class ParakeetSTTProcessor(BaseSTT):
 
 		return final_seg
 	
-	def generate_transcription(self, input_file):
-		"""Generate transcription using Parakeet."""
-		print(f"Transcribing: {input_file}")
-		duration = self._get_audio_duration(input_file)
+	def _inference_mode(self):
+		import torch
+		return torch.inference_mode()
+
+	def generate_transcription(self, audio, options=None):
+		"""Generate transcription using Parakeet.
+
+		Parakeet detects the language itself and always returns word timestamps,
+		so per-job options are ignored.
+		"""
+		duration = len(audio) / self.sample_rate
 		print(f"Processing audio duration: {duration:.2f} seconds")
 		
 		if duration > self.chunk_duration:
 			print(f"Audio exceeds {self.chunk_duration}s, using enhanced chunking with overlap handling...")
-			chunk_files = self._split_audio_file(input_file)
+			with instrument.stage("split", split_mode=self.split_mode) as fields:
+				chunks, offsets = self._split_audio(audio)
+				fields["chunks"] = len(chunks)
 			
-			if not chunk_files:
-				return None, None
+			if not chunks:
+				return None
 			
-			chunk_results = []
-			with torch.inference_mode():
-				for i, chunk_file in enumerate(chunk_files):
-					print(f"Processing chunk {i + 1}/{len(chunk_files)}")
-					result = self._transcribe_single_chunk(chunk_file)
-					chunk_results.append(result)
-
-			final_result = self._merge_chunk_results(chunk_results)
+			with instrument.stage("inference", audio_seconds=duration, chunks=len(chunks)), self._inference_mode():
+				chunk_results = self._transcribe_chunks(chunks)
+
+			with instrument.stage("merge", chunks=len(chunks)) as fields:
+				final_result = self._merge_chunk_results(chunk_results, offsets)
+				fields["words"] = len(final_result['timestamps']['word'])
+			instrument.count("chunks", len(chunks))
 		else:
 			print("Processing as single file...")
-			final_result = self._transcribe_single_chunk(input_file)
+			with instrument.stage("inference", audio_seconds=duration, chunks=1), self._inference_mode():
+				final_result = self._transcribe_single_chunk(audio)
 
 		transcription_result = {
 			"text": final_result['text'],
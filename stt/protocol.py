@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+class TextProtocol:
+	"""One input path per line, answered with `SUCCESS: <path>` or `ERROR: <path>`."""
+
+	def __init__(self, out):
+		self.out = out
+
+	@staticmethod
+	def request_id(line):
+		return line
+
+	def parse(self, line, args):
+		return {
+			"id": line,
+			"input": line,
+			"inline_result": False,
+			"args": argparse.Namespace(**{**vars(args), "input": line})
+		}
+
+	def respond(self, request, result=None, error=None, timings=None, output_dir=None):
+		if error:
+			self.out.write(f"Error processing {request['input']}: {error}\n")
+		status = "SUCCESS" if result else "ERROR"
+		self.out.write(f"{status}: {request['input']}\n")
+		self.out.flush()
+
+class JSONLProtocol:
+	"""One JSON request per line on stdin, one JSON response per line on stdout.
+
+	Request:
+		{"id": "job-1", "input": "/path/file.mp4",
+		 "options": {"language": "en", "word_timestamps": true, "formats": ["srt"]},
+		 "inline_result": true}
+
+	Response:
+		{"type": "result", "id": "job-1", "status": "ok" | "error", "input": "/path/file.mp4",
+		 "result": {...} | null, "output_dir": "...", "timings": {...}, "error": null | "..."}
+
+	Progress, any number of lines before the response:
+		{"type": "progress", "id": "job-1", "stage": "transcribe", "fraction": 0.4, "chunk": 2, "chunks": 5}
+
+	Timings are in seconds: "prepare" (validate, hash, decode), "transcribe" and
+	"total" (from reading the request to answering it). Progress stages are
+	"decode", "cached", "load", "transcribe" and "save"; "fraction" and
+	"chunk"/"chunks" are only sent when the engine knows them, and updates within
+	one stage are sent at most every STT_PROGRESS_INTERVAL seconds (0.25). Engine
+	log output is not part of the protocol; server mode sends it to stderr.
+	"""
+
+	REQUEST_OPTIONS = (
+		"language", "word_timestamps", "batch_size", "formats", "stream", "output_dir", "no_cache",
+		"model", "model_name", "device", "compute_type"
+	)
+
+	PROGRESS_FIELDS = ("stage", "fraction", "chunk", "chunks")
+
+	def __init__(self, out):
+		self.out = out
+		self.progress_interval = float(os.getenv("STT_PROGRESS_INTERVAL", 0.25))
+		# Prefetch threads report progress while the main thread answers requests
+		self._lock = threading.Lock()
+		self._last_progress = {}
+
+	def _write(self, message):
+		line = json.dumps(message, ensure_ascii=False) + "\n"
+		with self._lock:
+			self.out.write(line)
+			self.out.flush()
+
+	def progress(self, event):
+		"""stt.instrument sink that forwards progress events of the current job."""
+		if event["event"] != "progress":
+			return
+		job_id = event.get("job")
+		now = time.monotonic()
+		last = self._last_progress.get(job_id)
+		if last and last[0] == event["stage"] and now - last[1] < self.progress_interval and event.get("fraction") != 1.0:
+			return
+		self._last_progress[job_id] = (event["stage"], now)
+		self._write({
+			"type": "progress",
+			"id": job_id,
+			**{name: event[name] for name in self.PROGRESS_FIELDS if name in event}
+		})
+
+	def parse(self, line, args):
+		message = json.loads(line)
+		if not isinstance(message, dict):
+			raise ValueError("Request must be a JSON object")
+		if not message.get("input"):
+			raise ValueError("Request is missing 'input'")
+
+		options = message.get("options") or {}
+		unknown = [name for name in options if name not in self.REQUEST_OPTIONS]
+		if unknown:
+			raise ValueError(f"Unknown option(s): {', '.join(unknown)}")
+
+		return {
+			"id": message.get("id"),
+			"input": message["input"],
+			"inline_result": bool(message.get("inline_result", False)),
+			"args": argparse.Namespace(**{**vars(args), **options, "input": message["input"]})
+		}
+
+	@staticmethod
+	def request_id(line):
+		"""Best-effort id of a request that failed to parse."""
+		try:
+			message = json.loads(line)
+			return message.get("id") if isinstance(message, dict) else None
+		except ValueError:
+			return None
+
+	def respond(self, request, result=None, error=None, timings=None, output_dir=None):
+		self._last_progress.pop(request.get("id"), None)
+		response = {
+			"type": "result",
+			"id": request.get("id"),
+			"status": "ok" if result else "error",
+			"input": request.get("input"),
+			"result": result if result and request.get("inline_result") else None,
+			"output_dir": output_dir,
+			"timings": timings or {},
+			"error": error if error or result else "No transcription generated"
+		}
+		self._write(response)
+
+PROTOCOLS = {
+	"text": TextProtocol,
+	"jsonl": JSONLProtocol,
+}
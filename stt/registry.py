@@ -0,0 +1,40 @@
+import importlib
+from importlib.metadata import entry_points
+
+# Third-party packages can add engines by declaring an entry point in this group:
+#   [project.entry-points."stt_runner.engines"]
+#   myengine = "my_package.engine:MySTTProcessor"
+ENTRY_POINT_GROUP = "stt_runner.engines"
+
+# Used when the package runs from a source checkout without installed metadata
+BUILTIN_ENGINES = {
+	"openai": "stt.openai:OpenAISTTProcessor",
+	"parakeet": "stt.parakeet:ParakeetSTTProcessor",
+	"fasterwhispher": "stt.fasterwhispher:FasterWhispherSTTProcessor",
+	# No model weights, for benchmarking the pipeline itself
+	"stub": "stt.stub:StubSTTProcessor",
+}
+
+ALIASES = {
+	"fasterwhisper": "fasterwhispher",
+}
+
+def available_engines():
+	"""Map of engine name -> "module:Class" for built-in and entry-point engines."""
+	engines = dict(BUILTIN_ENGINES)
+	for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+		engines[entry_point.name] = entry_point.value
+	return engines
+
+def canonical_name(name):
+	return ALIASES.get(name, name)
+
+def get_engine_class(name):
+	name = canonical_name(name)
+	engines = available_engines()
+	if name not in engines:
+		raise ValueError(f"Unknown engine: {name}, available: {', '.join(sorted(engines))}")
+
+	module_name, _, class_name = engines[name].partition(":")
+	module = importlib.import_module(module_name)
+	return getattr(module, class_name)
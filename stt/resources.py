@@ -0,0 +1,138 @@
+"""CPU partitioning between audio decoding and model inference.
+
+The CPUs this process may use are split into STT_CPU_SLOTS equal partitions
+(one per concurrent engine process; STT_CPU_SLOT picks this process's one) and
+each partition is split again into disjoint decode and inference sets. ffmpeg is
+pinned to the decode set, the engine process to the inference set, and thread
+pools are sized to match. Hyper-threads of one physical core always stay in the
+same set.
+
+	STT_DECODE_CPUS=0-1 STT_INFERENCE_CPUS=2-15   explicit sets (cpu lists)
+	STT_CPU_SLOTS=4 STT_CPU_SLOT=1                second of four partitions
+	STT_DECODE_CPU_SHARE=0.125                    decode share of a partition
+"""
+import os
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+
+@dataclass(frozen=True)
+class ResourcePlan:
+	decode_cpus: tuple
+	inference_cpus: tuple
+	# Physical cores in the inference set; intra-op thread pools gain nothing from hyper-threads
+	inference_threads: int
+
+	@property
+	def decode_threads(self):
+		return len(self.decode_cpus)
+
+def parse_cpu_list(value):
+	"""Parse a cpu list such as "0-3,8,10-11" into a sorted tuple of cpu ids."""
+	cpus = set()
+	for part in value.split(","):
+		part = part.strip()
+		if not part:
+			continue
+		if "-" in part:
+			first, last = part.split("-")
+			cpus.update(range(int(first), int(last) + 1))
+		else:
+			cpus.add(int(part))
+	return tuple(sorted(cpus))
+
+def format_cpu_list(cpus):
+	return ",".join(str(cpu) for cpu in cpus)
+
+def available_cpus():
+	if hasattr(os, "sched_getaffinity"):
+		return tuple(sorted(os.sched_getaffinity(0)))
+	return tuple(range(os.cpu_count() or 1))
+
+def _read_topology(cpu, name):
+	try:
+		with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/{name}") as f:
+			return f.read().strip()
+	except OSError:
+		return None
+
+def physical_cores(cpus):
+	"""Group cpus into physical cores (tuples of sibling hyper-threads), ordered by socket."""
+	cores = {}
+	for cpu in cpus:
+		siblings = _read_topology(cpu, "thread_siblings_list")
+		package = _read_topology(cpu, "physical_package_id") or "0"
+		key = (int(package), parse_cpu_list(siblings) if siblings else (cpu,))
+		cores.setdefault(key, []).append(cpu)
+	return [tuple(members) for _, members in sorted(cores.items())]
+
+def _partition(cores, slots, slot):
+	"""Contiguous share of cores for one slot; slots beyond the core count share cores."""
+	if slots >= len(cores):
+		return [cores[slot % len(cores)]]
+	start = slot * len(cores) // slots
+	end = (slot + 1) * len(cores) // slots
+	return cores[start:end]
+
+def _flatten(cores):
+	return tuple(sorted(cpu for core in cores for cpu in core))
+
+@lru_cache(maxsize=1)
+def get_plan():
+	cpus = available_cpus()
+	decode_env = os.getenv("STT_DECODE_CPUS")
+	inference_env = os.getenv("STT_INFERENCE_CPUS")
+	if decode_env or inference_env:
+		# A set that isn't given gets the remaining cpus
+		decode_cpus = parse_cpu_list(decode_env) if decode_env else None
+		inference_cpus = parse_cpu_list(inference_env) if inference_env else None
+		if decode_cpus is None:
+			decode_cpus = tuple(cpu for cpu in cpus if cpu not in inference_cpus) or cpus
+		if inference_cpus is None:
+			inference_cpus = tuple(cpu for cpu in cpus if cpu not in decode_cpus) or cpus
+		return ResourcePlan(decode_cpus, inference_cpus, len(physical_cores(inference_cpus)))
+
+	slots = max(1, int(os.getenv("STT_CPU_SLOTS", 1)))
+	slot = int(os.getenv("STT_CPU_SLOT", 0)) % slots
+	cores = _partition(physical_cores(cpus), slots, slot)
+	if len(cores) < 2:
+		# Too small to split, decode and inference take turns on the same cores
+		shared = _flatten(cores)
+		return ResourcePlan(shared, shared, len(cores))
+
+	share = float(os.getenv("STT_DECODE_CPU_SHARE", 0.125))
+	decode_cores = min(len(cores) - 1, max(1, round(len(cores) * share)))
+	return ResourcePlan(_flatten(cores[:decode_cores]), _flatten(cores[decode_cores:]), len(cores) - decode_cores)
+
+def decode_command_prefix():
+	"""Pin a decoder command to the decode cpus, at low priority."""
+	plan = get_plan()
+	return ["taskset", "-c", format_cpu_list(plan.decode_cpus), "nice", "-n", "15"]
+
+_INFERENCE_APPLIED = False
+
+def apply_inference_plan():
+	"""Pin this process to the inference cpus and size torch/OpenMP thread pools, once.
+
+	Runs before an engine loads its model: OMP_NUM_THREADS/MKL_NUM_THREADS are
+	read when torch is first imported, torch.set_num_threads covers a torch that
+	is already loaded. ffmpeg is pinned separately, so it is unaffected. Affinity
+	is set on the calling thread and inherited by threads it starts afterwards,
+	which includes the inference thread pools.
+	"""
+	global _INFERENCE_APPLIED
+	if _INFERENCE_APPLIED:
+		return
+	_INFERENCE_APPLIED = True
+
+	plan = get_plan()
+	if hasattr(os, "sched_setaffinity"):
+		try:
+			os.sched_setaffinity(0, plan.inference_cpus)
+		except OSError as e:
+			print(f"Could not pin inference to cpus {format_cpu_list(plan.inference_cpus)}: {e}")
+	for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+		os.environ.setdefault(name, str(plan.inference_threads))
+	if "torch" in sys.modules:
+		sys.modules["torch"].set_num_threads(plan.inference_threads)
+	print(f"Inference on cpus {format_cpu_list(plan.inference_cpus)} ({plan.inference_threads} threads), decode on cpus {format_cpu_list(plan.decode_cpus)}")
@@ -5,31 +5,133 @@ import logging
 logging.getLogger().setLevel(logging.ERROR)
 
 import argparse
+import json
 import os
 import sys
+import time
+import queue
+import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from .protocol import PROTOCOLS
+from . import instrument
+from .base import load_env
+from .manager import ModelManager
+from .registry import available_engines
 
-STT_ENGINE = None
+MODELS = ModelManager()
 # os.environ['HF_HOME'] = os.path.abspath(os.path.realpath(os.path.join(os.path.dirname(__file__), './hf_download')))
 
+def _read_request(protocol, line, args):
+	"""Parse one stdin line, returning (request, error)."""
+	received = time.perf_counter()
+	try:
+		request, error = protocol.parse(line, args), None
+	except ValueError as e:
+		request, error = {"id": protocol.request_id(line), "input": None, "args": args}, f"Invalid request: {e}"
+	request["received"] = received
+	return request, error
+
+def _rejected(error):
+	def prepare():
+		raise ValueError(error)
+	return prepare
+
+def _prepare(request):
+	started = time.perf_counter()
+	# Runs on a prefetch thread in pipelined mode, so the job id is bound here too
+	with instrument.bind(job=request["id"]):
+		engine = get_engine(request["args"])
+		job = engine.prepare_job(request["args"])
+	return (engine, job), time.perf_counter() - started
+
+def _serve_request(protocol, request, prepare):
+	"""Run one request and send its response. prepare() returns ((engine, job), seconds)."""
+	result = None
+	error = None
+	timings = {}
+	output_dir = getattr(request["args"], "output_dir", None) or "./temp_dir"
+	try:
+		with instrument.bind(job=request["id"]):
+			(engine, job), timings["prepare"] = prepare()
+			output_dir = job["output_dir"]
+			run_started = time.perf_counter()
+			result = MODELS.run_job(engine, job)
+			timings["transcribe"] = time.perf_counter() - run_started
+	except Exception as e:
+		error = str(e)
+	timings["total"] = time.perf_counter() - request["received"]
+	timings = {name: round(seconds, 4) for name, seconds in timings.items()}
+
+	protocol.respond(request, result, error, timings, os.path.abspath(output_dir))
+
 def server_mode(args):
 	"""Run in server mode - read commands from stdin."""
-	global STT_ENGINE
-	
-	while True:
-		input_line = sys.stdin.readline().strip()
-		if not input_line:
-			break
-		
-		args.input = input_line
+	protocol = PROTOCOLS[args.protocol](sys.stdout)
+	if args.protocol == "jsonl":
+		# stdout carries protocol messages only; everything engines print goes to stderr
+		sys.stdout = sys.stderr
+		instrument.add_sink(protocol.progress)
 
-		result = initiate(args)
+	try:
+		if args.prefetch > 0:
+			pipelined_server_mode(args, protocol)
+			return
 		
-		if result:
-			print(f"SUCCESS: {args.input}")
-		else:
-			print(f"ERROR: {args.input}")
-		sys.stdout.flush()
+		while True:
+			input_line = sys.stdin.readline().strip()
+			if not input_line:
+				break
+			
+			request, error = _read_request(protocol, input_line, args)
+			if error:
+				_serve_request(protocol, request, _rejected(error))
+			else:
+				_serve_request(protocol, request, lambda: _prepare(request))
+	finally:
+		MODELS.unload_all()
+
+def pipelined_server_mode(args, protocol):
+	"""Server mode that decodes upcoming inputs while the current one is transcribed.
+
+	A reader thread submits each stdin request to a pool of prefetch threads, which
+	validate, hash and decode it. At most args.prefetch prepared jobs wait in the
+	queue, so memory for decoded audio stays bounded. Jobs are transcribed and
+	answered in input order.
+	"""
+	pending = queue.Queue(maxsize=args.prefetch)
+	executor = ThreadPoolExecutor(max_workers=args.prefetch, thread_name_prefix="stt-prefetch")
+
+	def read_inputs():
+		try:
+			while True:
+				input_line = sys.stdin.readline().strip()
+				if not input_line:
+					break
+				request, error = _read_request(protocol, input_line, args)
+				if error:
+					# Answered from the main thread, in order with the other responses
+					prepare = _rejected(error)
+				else:
+					prepare = executor.submit(_prepare, request).result
+				# Blocks while the queue is full, which is what bounds the prefetch
+				pending.put((request, prepare))
+		finally:
+			pending.put(None)
+
+	reader = threading.Thread(target=read_inputs, name="stt-stdin", daemon=True)
+	reader.start()
+
+	try:
+		while True:
+			item = pending.get()
+			if item is None:
+				break
+
+			request, prepare = item
+			_serve_request(protocol, request, prepare)
+	finally:
+		executor.shutdown(wait=False, cancel_futures=True)
 
 def check_for_dependency(model):
 	"""
@@ -66,32 +168,48 @@ def current_env():
 		return os.path.basename(venv_path)
 	raise ValueError("Please set env first")
 
-def initiate(args):
+def resolve_engine_name(args):
 	model = args.get('model') if isinstance(args, dict) else getattr(args, 'model', None)
-	if not model:
-		if current_env() == "openai_env":
-			from .openai import OpenAISTTProcessor as STTEngine
-		elif current_env() == "parakeet_env":
-			from .parakeet import ParakeetSTTProcessor as STTEngine
-		elif current_env() == "fasterwhispher_env":
-			from .fasterwhispher import FasterWhispherSTTProcessor as STTEngine
-	else:
-		if model == "openai":
-			from .openai import OpenAISTTProcessor as STTEngine
-		elif model == "parakeet":
-			from .parakeet import ParakeetSTTProcessor as STTEngine
-		elif model == "fasterwhispher":
-			from .fasterwhispher import FasterWhispherSTTProcessor as STTEngine
+	if model:
+		return model
+	env_engines = {
+		"openai_env": "openai",
+		"parakeet_env": "parakeet",
+		"fasterwhispher_env": "fasterwhispher",
+	}
+	env = current_env()
+	if env not in env_engines:
+		raise ValueError(f"Cannot pick an engine for environment '{env}', pass --model")
+	return env_engines[env]
 
-		# check_for_dependency(model)
+def get_engine(args):
+	"""Return the resident engine for the engine/model/device/compute type in args."""
+	def arg(name):
+		return args.get(name) if isinstance(args, dict) else getattr(args, name, None)
 
-	global STT_ENGINE
-	if not STT_ENGINE:
-		STT_ENGINE = STTEngine()
+	# check_for_dependency(model)
+	return MODELS.get(
+		resolve_engine_name(args),
+		model_name=arg('model_name'),
+		device=arg('device'),
+		compute_type=arg('compute_type')
+	)
 
-	result = STT_ENGINE.transcribe(args)
+def initiate(args):
+	engine = get_engine(args)
+	result = MODELS.run_job(engine, engine.prepare_job(args))
 	return result
 
+def autotune_mode(args):
+	"""Benchmark faster-whisper settings on this host and save the fastest profile."""
+	from . import autotune
+	from .common import get_device
+
+	model_name = args.model_name or "base"
+	profile = autotune.autotune(model_name, args.device or get_device(), clip=args.input)
+	print(json.dumps(profile, indent=4))
+	return 0
+
 def live_mode(args):
 	"""Run in live microphone transcription mode."""
 	from .live import LiveSTTProcessor
@@ -106,6 +224,11 @@ def live_mode(args):
 
 def main():
 	"""Main entry point."""
+	# Before anything reads its settings: STT_EVENTS, STT_MODEL_MEMORY_BUDGET_MB,
+	# STT_PROGRESS_INTERVAL and the thread settings may all come from .env
+	load_env()
+	instrument.configure_from_env()
+
 	parser = argparse.ArgumentParser(
 		description="Speech-to-Text processor using Whisper"
 	)
@@ -114,13 +237,69 @@ def main():
 		action="store_true", 
 		help="Run in server mode (read commands from stdin)"
 	)
+	parser.add_argument(
+		"--protocol",
+		choices=sorted(PROTOCOLS),
+		default="text",
+		help="Server mode: 'text' takes one path per line, 'jsonl' takes JSON requests and answers with JSON responses"
+	)
+	parser.add_argument(
+		"--prefetch",
+		type=int,
+		default=0,
+		help="Server mode: number of upcoming inputs to decode ahead while transcribing (0 = off)"
+	)
 	parser.add_argument(
 		"--input", 
 		help="Input audio/video file path"
 	)
 	parser.add_argument(
 		"--model",
-		help="model name"
+		help=f"Engine name, one of: {', '.join(sorted(available_engines()))}"
+	)
+	parser.add_argument(
+		"--model-name",
+		help="Model to load in the engine (default: the engine's default model)"
+	)
+	parser.add_argument(
+		"--device",
+		help="cuda or cpu (default: detect)"
+	)
+	parser.add_argument(
+		"--compute-type",
+		help="Engine compute type, e.g. int8 or float16 for faster-whisper"
+	)
+	parser.add_argument(
+		"--output-dir",
+		help="Directory for output_transcription.txt/json (default: ./temp_dir)"
+	)
+	parser.add_argument(
+		"--language",
+		help="Language code, e.g. 'en' (default: detect)"
+	)
+	parser.add_argument(
+		"--batch-size",
+		type=int,
+		help="faster-whisper: decode VAD segments in batches of this size (0 = sequential)"
+	)
+	parser.add_argument(
+		"--formats",
+		help="Extra output formats, comma separated: jsonl,srt,vtt"
+	)
+	parser.add_argument(
+		"--stream",
+		action="store_true",
+		help="Write segments to the output formats as they are decoded (default format: jsonl)"
+	)
+	parser.add_argument(
+		"--no-cache",
+		action="store_true",
+		help="Skip the transcription result cache"
+	)
+	parser.add_argument(
+		"--autotune",
+		action="store_true",
+		help="Benchmark faster-whisper compute types and thread counts on this host and save the fastest (--input overrides the clip)"
 	)
 	parser.add_argument(
 		"--live",
@@ -130,7 +309,9 @@ def main():
 	
 	args = parser.parse_args()
 
-	if args.live:
+	if args.autotune:
+		return autotune_mode(args)
+	elif args.live:
 		live_mode(args)
 	elif args.server_mode:
 		server_mode(args)
@@ -0,0 +1,72 @@
+import os
+import time
+from types import SimpleNamespace
+from .parakeet import ParakeetSTTProcessor
+
+class StubModel:
+	"""Stands in for a NeMo ASR model: emits evenly spaced words instead of running inference.
+
+	STT_STUB_RTF > 0 sleeps for that fraction of the audio duration per chunk, to
+	simulate a model of known speed.
+	"""
+
+	word_interval = 0.4
+	word_duration = 0.3
+	segment_duration = 10.0
+
+	def __init__(self, sample_rate, rtf=0.0):
+		self.sample_rate = sample_rate
+		self.rtf = rtf
+
+	def _output(self, audio):
+		duration = len(audio) / self.sample_rate
+		if self.rtf > 0:
+			time.sleep(duration * self.rtf)
+
+		words = []
+		start = 0.0
+		while start + self.word_duration <= duration:
+			words.append({"word": f"w{len(words)}", "start": start, "end": start + self.word_duration})
+			start += self.word_interval
+
+		segments = []
+		per_segment = max(1, int(self.segment_duration / self.word_interval))
+		for i in range(0, len(words), per_segment):
+			segment_words = words[i:i + per_segment]
+			segments.append({
+				"segment": " ".join(word["word"] for word in segment_words),
+				"start": segment_words[0]["start"],
+				"end": segment_words[-1]["end"]
+			})
+
+		return SimpleNamespace(
+			text=" ".join(word["word"] for word in words),
+			timestamp={"word": words, "segment": segments}
+		)
+
+	def transcribe(self, audio_list, batch_size=1, timestamps=True):
+		return [self._output(audio) for audio in audio_list]
+
+class StubSTTProcessor(ParakeetSTTProcessor):
+	"""Engine without model weights, for measuring pipeline overhead.
+
+	Decoding, chunking, merging, writing and caching run the real Parakeet code
+	paths; only inference is replaced by StubModel.
+	"""
+
+	default_model_name = "stub"
+
+	def __init__(self, model_name=None, device=None, compute_type=None):
+		super().__init__(model_name or self.default_model_name, device or "cpu", compute_type)
+		self.type = "stub"
+		self.rtf = float(os.getenv("STT_STUB_RTF", 0))
+
+	def _load_model(self):
+		self.model = StubModel(self.sample_rate, self.rtf)
+
+	def _inference_mode(self):
+		from contextlib import nullcontext
+		return nullcontext()
+
+	def cache_options(self):
+		return {**super().cache_options(), "rtf": self.rtf}
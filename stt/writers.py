@@ -0,0 +1,121 @@
+import os
+import json
+
+FORMATS = ("jsonl", "srt", "vtt")
+
+def _timestamp(seconds, separator):
+	millis = int(round(max(seconds, 0) * 1000))
+	hours, millis = divmod(millis, 3600 * 1000)
+	minutes, millis = divmod(millis, 60 * 1000)
+	secs, millis = divmod(millis, 1000)
+	return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+class JSONLWriter:
+	"""One JSON object per line: a segment with its words."""
+
+	extension = "jsonl"
+
+	def __init__(self, f):
+		self.f = f
+
+	def write(self, segment, words):
+		line = {**segment, "words": words}
+		self.f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+class SRTWriter:
+	extension = "srt"
+
+	def __init__(self, f):
+		self.f = f
+		self.index = 0
+
+	def write(self, segment, words):
+		self.index += 1
+		start = _timestamp(segment["start"], ",")
+		end = _timestamp(segment["end"], ",")
+		self.f.write(f"{self.index}\n{start} --> {end}\n{segment['text'].strip()}\n\n")
+
+class VTTWriter:
+	extension = "vtt"
+
+	def __init__(self, f):
+		self.f = f
+		self.f.write("WEBVTT\n\n")
+
+	def write(self, segment, words):
+		start = _timestamp(segment["start"], ".")
+		end = _timestamp(segment["end"], ".")
+		self.f.write(f"{start} --> {end}\n{segment['text'].strip()}\n\n")
+
+WRITERS = {writer.extension: writer for writer in (JSONLWriter, SRTWriter, VTTWriter)}
+
+def parse_formats(formats):
+	"""Accept a list or a comma separated string of output formats."""
+	if not formats:
+		return []
+	if isinstance(formats, str):
+		formats = formats.split(",")
+	formats = [fmt.strip().lower() for fmt in formats if fmt and fmt.strip()]
+	unknown = [fmt for fmt in formats if fmt not in WRITERS]
+	if unknown:
+		raise ValueError(f"Unsupported output format(s): {', '.join(unknown)}, supported: {', '.join(FORMATS)}")
+	return list(dict.fromkeys(formats))
+
+class SegmentWriter:
+	"""Writes segments to every requested format as soon as they are produced.
+
+	Files are flushed after each segment, so they can be read while the job is
+	still running.
+	"""
+
+	def __init__(self, output_dir, formats, base_name="output_transcription"):
+		os.makedirs(output_dir, exist_ok=True)
+		self.files = {}
+		self.writers = []
+		for fmt in formats:
+			path = os.path.join(output_dir, f"{base_name}.{fmt}")
+			f = open(path, 'w', encoding='utf-8')
+			self.files[fmt] = path
+			self.writers.append((f, WRITERS[fmt](f)))
+
+	def write(self, segment, words):
+		for f, writer in self.writers:
+			writer.write(segment, words)
+			f.flush()
+
+	def write_result(self, result):
+		for segment, words in iter_result_segments(result):
+			self.write(segment, words)
+
+	def close(self):
+		for f, _ in self.writers:
+			f.close()
+		self.writers = []
+		for fmt, path in self.files.items():
+			print(f"{fmt.upper()} transcription saved as {path}")
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.close()
+
+def iter_result_segments(result):
+	"""Yield (segment, words) pairs from a finished result of any engine.
+
+	faster-whisper and Parakeet results keep segments and words in two sorted
+	lists, which are paired up in one pass; Whisper segments carry their words.
+	"""
+	segments = result.get("segments")
+	if isinstance(segments, dict):
+		words = segments.get("word") or []
+		index = 0
+		for segment in segments.get("segment") or []:
+			segment_words = []
+			while index < len(words) and words[index]["start"] < segment["end"]:
+				segment_words.append(words[index])
+				index += 1
+			yield {"start": segment["start"], "end": segment["end"], "text": segment["text"]}, segment_words
+	else:
+		for segment in segments or []:
+			yield {"start": segment["start"], "end": segment["end"], "text": segment["text"]}, segment.get("words") or []
@@ -0,0 +1,146 @@
+"""Merging of overlapping Parakeet chunk results, on synthetic word streams.
+
+No model is loaded: ParakeetSTTProcessor only loads NeMo on first transcription.
+"""
+import bisect
+import time
+
+import pytest
+
+from stt.parakeet import ParakeetSTTProcessor
+
+WORD_INTERVAL = 0.4
+WORD_LENGTH = 0.3
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+	monkeypatch.setenv("STT_CACHE_DIR", str(tmp_path))
+	return ParakeetSTTProcessor(device="cpu")
+
+
+def word_stream(duration, first=0.1, interval=WORD_INTERVAL):
+	"""Words every `interval` seconds; the default first start keeps them off chunk boundaries."""
+	count = int((duration - first) / interval)
+	return [
+		{"word": f"w{i}", "start": first + i * interval, "end": first + i * interval + WORD_LENGTH}
+		for i in range(count)
+	]
+
+
+def chunk_stream(words, duration, chunk_duration, overlap):
+	"""Cut a sorted absolute word stream into chunk results with chunk-relative timestamps, as the model returns them."""
+	starts = [word["start"] for word in words]
+	chunk_results = []
+	offsets = []
+	offset = 0.0
+	while True:
+		end = min(offset + chunk_duration, duration)
+		chunk_words = [
+			{"word": word["word"], "start": word["start"] - offset, "end": word["end"] - offset}
+			for word in words[bisect.bisect_left(starts, offset):bisect.bisect_left(starts, end)]
+		]
+		chunk_results.append({
+			"text": " ".join(word["word"] for word in chunk_words),
+			"timestamps": {"word": chunk_words, "segment": []}
+		})
+		offsets.append(offset)
+		if end >= duration:
+			return chunk_results, offsets
+		offset = end - overlap
+
+
+def merged_words(result):
+	return [word["word"] for word in result["timestamps"]["word"]]
+
+
+def assert_sorted(result):
+	starts = [word["start"] for word in result["timestamps"]["word"]]
+	assert starts == sorted(starts)
+
+
+def test_overlap_words_removed(processor):
+	words = word_stream(100)
+	chunk_results, offsets = chunk_stream(words, 100, chunk_duration=30, overlap=5)
+	assert len(chunk_results) == 4
+
+	result = processor._merge_chunk_results(chunk_results, offsets)
+
+	assert merged_words(result) == [word["word"] for word in words]
+	assert result["text"] == " ".join(word["word"] for word in words)
+	for merged, expected in zip(result["timestamps"]["word"], words):
+		assert merged["start"] == pytest.approx(expected["start"])
+		assert merged["end"] == pytest.approx(expected["end"])
+	assert_sorted(result)
+
+
+def test_no_duplicates_at_boundaries(processor):
+	# Words start exactly on the chunk starts, so both neighbours transcribe them
+	words = word_stream(60, first=0.0, interval=0.5)
+	chunk_results, offsets = chunk_stream(words, 60, chunk_duration=20, overlap=4)
+	starts = {word["start"] for word in words}
+	assert all(offset in starts for offset in offsets[1:])
+
+	result = processor._merge_chunk_results(chunk_results, offsets)
+
+	names = merged_words(result)
+	assert len(names) == len(set(names))
+	assert names == [word["word"] for word in words]
+	assert_sorted(result)
+
+
+def test_zero_overlap_keeps_every_word(processor):
+	# Silence split mode cuts at pauses with no overlap, so nothing may be dropped
+	words = word_stream(90)
+	chunk_results, offsets = chunk_stream(words, 90, chunk_duration=30, overlap=0)
+
+	result = processor._merge_chunk_results(chunk_results, offsets)
+
+	assert merged_words(result) == [word["word"] for word in words]
+	assert_sorted(result)
+
+
+def test_silent_chunks(processor):
+	chunk_results = [
+		{"text": "a b", "timestamps": {"word": [
+			{"word": "a", "start": 1.0, "end": 1.3},
+			{"word": "b", "start": 2.0, "end": 2.3},
+		]}},
+		{"text": "", "timestamps": {"word": []}},
+		{"text": "", "timestamps": {}},
+		{"text": "c", "timestamps": {"word": [{"word": "c", "start": 0.5, "end": 0.8}]}},
+	]
+	offsets = [0.0, 10.0, 20.0, 30.0]
+
+	result = processor._merge_chunk_results(chunk_results, offsets)
+
+	assert result["text"] == "a b c"
+	assert [word["start"] for word in result["timestamps"]["word"]] == pytest.approx([1.0, 2.0, 30.5])
+	assert [segment["text"] for segment in result["timestamps"]["segment"]] == ["a b", "c"]
+
+
+def test_find_timestamp_overlap(processor):
+	words = [{"word": str(i), "start": float(i)} for i in range(10)]
+
+	assert processor._find_timestamp_overlap([], 3.0) == 0
+	assert processor._find_timestamp_overlap(words, 20.0) == 0
+	assert processor._find_timestamp_overlap(words, 6.5) == 3
+	assert processor._find_timestamp_overlap(words, 6.0) == 4
+	assert processor._find_timestamp_overlap(words, -1.0) == 10
+
+
+def test_merge_thousands_of_chunks(processor):
+	duration = 3000 * 25 + 5
+	words = word_stream(duration)
+	chunk_results, offsets = chunk_stream(words, duration, chunk_duration=30, overlap=5)
+	assert len(chunk_results) >= 3000
+
+	started = time.perf_counter()
+	result = processor._merge_chunk_results(chunk_results, offsets)
+	elapsed = time.perf_counter() - started
+
+	assert len(result["timestamps"]["word"]) == len(words)
+	assert merged_words(result) == [word["word"] for word in words]
+	assert_sorted(result)
+	# About 190k words; the merge is linear in the word count and takes well under a second
+	assert elapsed < 3.0